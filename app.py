@@ -7,11 +7,10 @@ if os.environ.get('RENDER') or os.environ.get('VERCEL'):
     os.environ['YOLO_VERBOSE'] = 'False'
 
 from flask import Flask, render_template, Response, jsonify, send_from_directory, request, redirect, url_for, flash, session
-import cv2
-import numpy as np
-import time
 import os
-from detect import detect_objects
+import detect
+import metrics
+from pipeline import DEFAULT_TIER, STREAM_TIERS, PipelineGroup
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -130,8 +129,6 @@ with app.app_context():
         print(f"Database initialization error: {e}")
 
 
-# Camera is opened lazily and re-opened when needed so app starts even without a camera
-camera = None
 # Default to 'sample' if in cloud environment (no webcam available)
 default_source = 'sample' if os.environ.get('VERCEL') or os.environ.get('RENDER') else '0'
 src_env = os.getenv('VIDEO_SOURCE', default_source)
@@ -141,80 +138,16 @@ if sample_mode:
 else:
     print("Using real camera")
     print(f"Using video source: {src_env}")
-detecting = True
-
-# Global stats tracking
-current_stats = {
-    "faces": 0,
-    "humans": 0,
-    "vehicles": 0,
-    "cars": 0,
-    "motorcycles": 0,
-    "buses": 0,
-    "trucks": 0,
-    "traffic_lights": 0,
-    "dogs": 0,
-    "cats": 0,
-    "cows": 0,
-    "horses": 0,
-    "zebra_crossings": 0,
-    "footpaths": 0,
-    "buffaloes": 0,
-    "bullock_carts": 0,
-    "fps": 0
-}
-
-
-def get_camera():
-    """Return a working cv2.VideoCapture or None if it cannot be opened."""
-    global camera
-    if camera is None or not getattr(camera, 'isOpened', lambda: False)():
-        # allow VIDEO_SOURCE env var to specify device index, file path or URL
-        src = os.getenv('VIDEO_SOURCE', '0')
-        global sample_mode
-        try:
-            # special value 'sample' uses a generated animated stream for testing without hardware
-            if isinstance(src, str) and src.strip().lower() == 'sample':
-                sample_mode = True
-                print("Using synthetic sample video stream (no camera required)")
-                camera = None
-                return camera
-
-            if isinstance(src, str) and src.isdigit():
-                src_val = int(src)
-            else:
-                src_val = src
-
-            print("Opening camera source:", src_val)
-            # Try opening with different backends for better compatibility
-            if os.name == 'nt': # Windows
-                camera = cv2.VideoCapture(src_val, cv2.CAP_DSHOW)
-            else:
-                camera = cv2.VideoCapture(src_val)
-            
-            if not camera.isOpened():
-                camera = cv2.VideoCapture(src_val)  # Fallback
-            
-            time.sleep(0.5)
-
-            if not camera.isOpened():
-                print("Camera failed to open")
-                try:
-                    camera.release()
-                except Exception:
-                    pass
-                camera = None
-            else:
-                print("Camera opened successfully")
-                # Set some properties for better performance
-                camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-        except Exception as e:
-            print("Camera exception:", e)
-            camera = None
+# Shared capture/detection/encode pipelines, one per comma-separated VIDEO_SOURCE
+# entry. Cameras are opened lazily by their capture threads so the app starts
+# even without a camera
+pipelines = PipelineGroup(src_env)
 
-    return camera
+# Load detection models in the background so /health and the auth pages are
+# served immediately; /ready reports progress. With DETECT_WORKERS > 0 they are
+# loaded by the detection worker processes instead of this one
+pipelines.start_loading()
 
 
 # ========================= ROUTES ========================= #
@@ -240,22 +173,98 @@ def index():
 
 @app.route("/toggle")
 def toggle():
-    global detecting
-    detecting = not detecting
-    return jsonify({"status": detecting})
+    pipelines.detecting = not pipelines.detecting
+    return jsonify({"status": pipelines.detecting})
 
 
 @app.route("/status")
 def status():
     """Return current detection status for the UI to poll safely."""
-    return jsonify({"status": detecting})
+    return jsonify({"status": pipelines.detecting})
+
+
+def stats_response(pipeline):
+    """
+    Latest statistics of a pipeline. With ?since=<frame_id> only a newer frame is
+    returned (304 otherwise); ?wait=<seconds> long-polls up to 30 s for one.
+    """
+    pipelines.start()
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(pipeline.stats.to_dict())
+    wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), 30.0)
+    snapshot = pipeline.wait_for_snapshot(since, wait)
+    if snapshot.frame_id <= since:
+        return '', 304
+    return jsonify(snapshot.to_dict())
 
 
 @app.route("/stats")
 def stats():
     """Return current detection statistics."""
-    global current_stats
-    return jsonify(current_stats)
+    return stats_response(pipelines.default)
+
+
+@app.route("/stats/<source_id>")
+def source_stats(source_id):
+    """Return current detection statistics for one video source."""
+    pipeline = pipelines.get(source_id)
+    if pipeline is None:
+        return jsonify({"error": f"Unknown video source: {source_id}"}), 404
+    return stats_response(pipeline)
+
+
+def hazard_response(pipeline):
+    """
+    Latest crossing-safety alert of a pipeline, published as soon as YOLO and the
+    zebra-crossing detector finish. ?since=<alert_id>&wait=<seconds> long-polls
+    like /stats.
+    """
+    pipelines.start()
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(pipeline.alert.to_dict())
+    wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), 30.0)
+    alert = pipeline.wait_for_alert(since, wait)
+    if alert.alert_id <= since:
+        return '', 304
+    return jsonify(alert.to_dict())
+
+
+@app.route("/hazard")
+def hazard():
+    """Return the current crossing-safety alert."""
+    return hazard_response(pipelines.default)
+
+
+@app.route("/hazard/<source_id>")
+def source_hazard(source_id):
+    """Return the current crossing-safety alert for one video source."""
+    pipeline = pipelines.get(source_id)
+    if pipeline is None:
+        return jsonify({"error": f"Unknown video source: {source_id}"}), 404
+    return hazard_response(pipeline)
+
+
+def events_response(pipeline):
+    pipelines.start()
+    return Response(pipeline.events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/events")
+def events():
+    """Push detection statistics as server-sent events (deltas, sent on change)."""
+    return events_response(pipelines.default)
+
+
+@app.route("/events/<source_id>")
+def source_events(source_id):
+    """Server-sent statistics for one video source."""
+    pipeline = pipelines.get(source_id)
+    if pipeline is None:
+        return jsonify({"error": f"Unknown video source: {source_id}"}), 404
+    return events_response(pipeline)
 
 
 @app.route("/dashboard")
@@ -272,6 +281,17 @@ def health():
     """Health check for Render deployment"""
     return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
 
+@app.route("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms and per-camera gauges in Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/ready")
+def ready():
+    """Model load progress; 503 until every detector has been loaded."""
+    status = dict(detect.model_status, loaded=list(detect.model_status["loaded"]))
+    return jsonify(status), (200 if detect.models_ready() else 503)
+
 # ========================= AUTH ROUTES ========================= #
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -290,8 +310,7 @@ def login():
                 db.session.commit()
             
             login_user(user)
-            global detecting
-            detecting = True
+            pipelines.detecting = True
             return redirect(url_for('index'))
         else:
             flash('Login failed. Check your email and password.', 'danger')
@@ -316,25 +335,17 @@ def signup():
         db.session.add(new_user)
         db.session.commit()
         login_user(new_user)
-        global detecting
-        detecting = True
+        pipelines.detecting = True
         return redirect(url_for('index'))
     return render_template('signup.html')
 
 @app.route('/logout')
 @login_required
 def logout():
-    global detecting, camera
-    detecting = False
-    
+    pipelines.detecting = False
+
     # Explicitly release camera
-    if camera is not None:
-        try:
-            camera.release()
-            print("Camera released on logout")
-        except Exception as e:
-            print(f"Error releasing camera: {e}")
-        camera = None
+    pipelines.release_cameras()
 
     logout_user()
     return redirect(url_for('login'))
@@ -356,8 +367,7 @@ def authorize_google():
         db.session.add(user)
         db.session.commit()
     login_user(user)
-    global detecting
-    detecting = True
+    pipelines.detecting = True
     return redirect(url_for('index'))
 
 @app.route('/login/facebook')
@@ -381,8 +391,7 @@ def authorize_facebook():
         db.session.add(user)
         db.session.commit()
     login_user(user)
-    global detecting
-    detecting = True
+    pipelines.detecting = True
     return redirect(url_for('index'))
 
 @app.route('/admin')
@@ -537,220 +546,27 @@ def reset_password(token):
 
 # ========================= VIDEO STREAM ========================= #
 
-def generate_frames():
-    global current_stats
-    reopen_counter = 0
-
-    # Simple state for sample animation
-    anim_pos = 0
-
-    while True:
-        # Synthetic sample stream mode (no camera required)
-        if sample_mode:
-            h, w = 480, 640
-            frame = np.zeros((h, w, 3), dtype=np.uint8)
-            # moving rectangle to show motion
-            x = anim_pos % (w - 120)
-            cv2.rectangle(frame, (x + 20, 120), (x + 120, 220), (0, 200, 0), -1)
-            cv2.putText(frame, "Sample Stream", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (200, 200, 200), 2)
-
-            anim_pos += 8
-
-            if detecting:
-                try:
-                    frame, fps, counts = detect_objects(frame)
-                    # Update global stats
-                    current_stats["fps"] = fps
-                    current_stats["faces"] = counts.get("Faces", 0)
-                    current_stats["humans"] = counts.get("Humans", 0)
-                    current_stats["vehicles"] = counts.get("Vehicles", 0)
-                    current_stats["cars"] = counts.get("Cars", 0)
-                    current_stats["motorcycles"] = counts.get("Motorcycles", 0)
-                    current_stats["buses"] = counts.get("Buses", 0)
-                    current_stats["trucks"] = counts.get("Trucks", 0)
-                    current_stats["traffic_lights"] = counts.get("Traffic_Lights", 0)
-                    current_stats["dogs"] = counts.get("Dogs", 0)
-                    current_stats["cats"] = counts.get("Cats", 0)
-                    current_stats["cows"] = counts.get("Cows", 0)
-                    current_stats["horses"] = counts.get("Horses", 0)
-                    current_stats["zebra_crossings"] = counts.get("Zebra_Crossings", 0)
-                    current_stats["footpaths"] = counts.get("Footpaths", 0)
-                    current_stats["buffaloes"] = counts.get("Buffaloes", 0)
-                    current_stats["bullock_carts"] = counts.get("Bullock_Carts", 0)
-                except Exception as e:
-                    fps = 0
-                    counts = {}
-                    print("Detection error:", e)
-                    current_stats["fps"] = 0
-                    current_stats["faces"] = 0
-                    current_stats["humans"] = 0
-                    current_stats["vehicles"] = 0
-                    current_stats["cars"] = 0
-                    current_stats["motorcycles"] = 0
-                    current_stats["buses"] = 0
-                    current_stats["trucks"] = 0
-                    current_stats["traffic_lights"] = 0
-                    current_stats["dogs"] = 0
-                    current_stats["cats"] = 0
-                    current_stats["cows"] = 0
-                    current_stats["horses"] = 0
-                    current_stats["zebra_crossings"] = 0
-                    current_stats["footpaths"] = 0
-                    current_stats["buffaloes"] = 0
-                    current_stats["bullock_carts"] = 0
-            else:
-                fps = 0
-                counts = {}
-
-                fps = 0
-                counts = {}
-
-            # Add FPS and counts overlay same as live stream
-            cv2.putText(frame, f"FPS: {fps}", (10, 25),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            y = 40
-            for obj, cnt in counts.items():
-                cv2.putText(frame, f"{obj}: {cnt}", (10, y + 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-                y += 25
-
-            ok, buffer = cv2.imencode(".jpg", frame)
-            frame = buffer.tobytes()
-
-            yield (b"--frame\r\n"
-                   b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
-
-            # throttle synthetic stream to reasonable rate
-            time.sleep(0.03)
-            continue
-        
-        # --- End Sample Mode ---
-
-        # If user logs out, stop detection logic
-        # We check context safely. Note: streaming runs in a separate thread/context usually,
-        # but accessing current_user outside request context needs care.
-        # Simple approach: rely on 'detecting' flag or just let it run but stop if global detecting is False AND no one watching?
-        # Better: just check if we should be detecting.
-        
-        # For simplicity in this loop:
-        if not detecting:  
-             # Release camera to save resources
-             if camera is not None:
-                 camera.release()
-                 camera = None
-             
-             # Sent a placeholder
-             frame = np.zeros((480, 640, 3), dtype=np.uint8)
-             cv2.putText(frame, "Detection Paused", (180, 240),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-             _, buffer = cv2.imencode(".jpg", frame)
-             yield (b"--frame\r\n"
-                   b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n")
-             time.sleep(1.0) # Sleep longer when paused
-             continue
-
-        cam = get_camera()
-        success = False
-        frame = None
-
-        if cam is not None:
-            try:
-                success, frame = cam.read()
-            except Exception:
-                success = False
-
-        if not success or frame is None:
-            # Placeholder frame when camera is not available
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, "Camera not available", (30, 240),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-
-            # periodically try to re-open camera
-            reopen_counter += 1
-            if reopen_counter >= 10:
-                reopen_counter = 0
-                try:
-                    if camera is not None:
-                        camera.release()
-                except Exception:
-                    pass
-
-        if detecting:
-            try:
-                frame, fps, counts = detect_objects(frame)
-                # Update global stats
-                current_stats["fps"] = fps
-                current_stats["faces"] = counts.get("Faces", 0)
-                current_stats["humans"] = counts.get("Humans", 0)
-                current_stats["vehicles"] = counts.get("Vehicles", 0)
-                current_stats["cars"] = counts.get("Cars", 0)
-                current_stats["motorcycles"] = counts.get("Motorcycles", 0)
-                current_stats["buses"] = counts.get("Buses", 0)
-                current_stats["trucks"] = counts.get("Trucks", 0)
-                current_stats["traffic_lights"] = counts.get("Traffic_Lights", 0)
-                current_stats["dogs"] = counts.get("Dogs", 0)
-                current_stats["cats"] = counts.get("Cats", 0)
-                current_stats["cows"] = counts.get("Cows", 0)
-                current_stats["horses"] = counts.get("Horses", 0)
-                current_stats["zebra_crossings"] = counts.get("Zebra_Crossings", 0)
-                current_stats["footpaths"] = counts.get("Footpaths", 0)
-                current_stats["buffaloes"] = counts.get("Buffaloes", 0)
-                current_stats["bullock_carts"] = counts.get("Bullock_Carts", 0)
-            except Exception as e:
-                fps = 0
-                counts = {}
-                print("Detection error:", e)
-                cv2.putText(frame, "Detection error", (10, 30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                current_stats["fps"] = 0
-                current_stats["faces"] = 0
-                current_stats["humans"] = 0
-                current_stats["vehicles"] = 0
-                current_stats["cars"] = 0
-                current_stats["motorcycles"] = 0
-                current_stats["buses"] = 0
-                current_stats["trucks"] = 0
-                current_stats["traffic_lights"] = 0
-                current_stats["dogs"] = 0
-                current_stats["cats"] = 0
-                current_stats["cows"] = 0
-                current_stats["horses"] = 0
-                current_stats["zebra_crossings"] = 0
-                current_stats["footpaths"] = 0
-                current_stats["buffaloes"] = 0
-                current_stats["bullock_carts"] = 0
-
-            # FPS
-            cv2.putText(frame, f"FPS: {fps}", (10, 25),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-
-            # Object-wise count
-            y = 40
-            for obj, cnt in counts.items():
-                cv2.putText(frame, f"{obj}: {cnt}",
-                            (10, y + 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-                y += 25
-
-        # Encode frame
-        ok, buffer = cv2.imencode(".jpg", frame)
-        if not ok:
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, "Frame encode error", (10, 240),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            _, buffer = cv2.imencode(".jpg", frame)
-
-        frame = buffer.tobytes()
-
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+def stream_response(pipeline):
+    # ?tier=mobile sends half-resolution, lower-quality JPEGs for weak connections
+    tier = request.args.get('tier', DEFAULT_TIER)
+    if tier not in STREAM_TIERS:
+        return jsonify({"error": f"Unknown tier: {tier}", "tiers": list(STREAM_TIERS)}), 400
+    pipelines.start()
+    return Response(pipeline.stream(tier),
+                    mimetype="multipart/x-mixed-replace; boundary=frame")
 
 
 @app.route("/video")
 def video():
-    return Response(generate_frames(),
-                    mimetype="multipart/x-mixed-replace; boundary=frame")
+    return stream_response(pipelines.default)
+
+
+@app.route("/video/<source_id>")
+def source_video(source_id):
+    pipeline = pipelines.get(source_id)
+    if pipeline is None:
+        return jsonify({"error": f"Unknown video source: {source_id}"}), 404
+    return stream_response(pipeline)
 
 
 # ========================= STATIC FILES ========================= #
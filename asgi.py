@@ -0,0 +1,193 @@
+"""
+ASGI entry point for serving many concurrent viewers from one process:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+/video, /stats, /hazard and /events (and their /<source_id> variants) are served on
+the event loop. A viewer is a coroutine that sleeps until its pipeline
+publishes, not a worker thread, so hundreds of mostly idle viewers cost
+neither threads nor extra detection. Capture and detection keep running in
+their own threads as before. Every other route (login, admin, health, ...)
+goes to the Flask app through a2wsgi.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import metrics
+from app import app as flask_app, pipelines
+from pipeline import DEFAULT_TIER, STREAM_TIERS, StatsEvents
+
+wsgi = WSGIMiddleware(flask_app)
+
+
+class PublishSignal:
+    """Wakes the coroutines waiting on one pipeline whenever it publishes."""
+
+    def __init__(self, pipeline, loop):
+        self._loop = loop
+        self._future = loop.create_future()
+        pipeline.add_listener(self._notify)
+
+    def _notify(self):
+        # Called on the detection thread
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(None)
+        self._future = self._loop.create_future()
+
+    async def wait(self, timeout=None):
+        """Wait for the next publish. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+_signals = {}  # source_id -> PublishSignal
+
+
+def publish_signal(pipeline):
+    signal = _signals.get(pipeline.source_id)
+    if signal is None:
+        signal = _signals[pipeline.source_id] = PublishSignal(pipeline, asyncio.get_running_loop())
+    return signal
+
+
+async def send_json(send, data, status=200):
+    body = json.dumps(data).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def until_disconnect(receive, coro):
+    """Run a streaming coroutine until it ends or the client goes away."""
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    stream = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(disconnected())
+    done, pending = await asyncio.wait({stream, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if stream in done:
+        stream.result()
+
+
+async def long_poll(scope, send, pipeline, latest, record_id):
+    """
+    Send latest().to_dict(). With ?since=<id> wait (up to ?wait= seconds) until
+    record_id(latest()) is newer, answering 304 if it never is.
+    """
+    pipelines.start()
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        since = int(query["since"][0]) if "since" in query else None
+        wait = min(max(float(query.get("wait", ["0"])[0]), 0.0), 30.0)
+    except ValueError:
+        await send_json(send, {"error": "since must be an integer and wait a number"}, 400)
+        return
+    if since is None:
+        await send_json(send, latest().to_dict())
+        return
+
+    # Long poll without holding a thread: wake on every publish until a newer record exists
+    signal = publish_signal(pipeline)
+    deadline = time.time() + wait
+    while record_id(latest()) <= since and time.time() < deadline:
+        await signal.wait(deadline - time.time())
+    record = latest()
+    if record_id(record) <= since:
+        await send({"type": "http.response.start", "status": 304, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send_json(send, record.to_dict())
+
+
+async def stats(scope, receive, send, pipeline):
+    await long_poll(scope, send, pipeline, lambda: pipeline.stats, lambda snapshot: snapshot.frame_id)
+
+
+async def hazard(scope, receive, send, pipeline):
+    await long_poll(scope, send, pipeline, lambda: pipeline.alert, lambda alert: alert.alert_id)
+
+
+async def video(scope, receive, send, pipeline):
+    tier = parse_qs(scope.get("query_string", b"").decode()).get("tier", [DEFAULT_TIER])[0]
+    if tier not in STREAM_TIERS:
+        await send_json(send, {"error": f"Unknown tier: {tier}", "tiers": list(STREAM_TIERS)}, 400)
+        return
+    pipelines.start()
+    signal = publish_signal(pipeline)
+
+    async def frames():
+        # Only frames rendered after this viewer joined are sent
+        last_seq = pipeline.seq
+        while True:
+            seq, chunk = pipeline.latest_chunk(tier, last_seq)
+            if chunk is None:
+                await signal.wait(5.0)
+                continue
+            last_seq = seq
+            started = time.perf_counter()
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            metrics.observe('yield', pipeline.source_id, time.perf_counter() - started)
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"multipart/x-mixed-replace; boundary=frame"),
+                            (b"cache-control", b"no-cache")]})
+    pipeline.add_viewer(tier)
+    try:
+        await until_disconnect(receive, frames())
+    finally:
+        pipeline.remove_viewer(tier)
+
+
+async def events(scope, receive, send, pipeline):
+    pipelines.start()
+    signal = publish_signal(pipeline)
+
+    async def stream():
+        state = StatsEvents(pipeline)
+        version = -1
+        while True:
+            current, snapshot = pipeline.wait_for_stats(version, timeout=0)
+            if current == version and state.timeout() > 0:
+                await signal.wait(state.timeout())
+                continue
+            version = current
+            event = state.event(version, snapshot)
+            if event:
+                await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"),
+                            (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+    await until_disconnect(receive, stream())
+
+
+ROUTES = {"video": video, "stats": stats, "hazard": hazard, "events": events}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http":
+        route, _, source_id = scope["path"].strip("/").partition("/")
+        handler = ROUTES.get(route)
+        if handler is not None and "/" not in source_id:
+            pipeline = pipelines.get(source_id) if source_id else pipelines.default
+            if pipeline is None:
+                await send_json(send, {"error": f"Unknown video source: {source_id}"}, 404)
+                return
+            await handler(scope, receive, send, pipeline)
+            return
+    await wsgi(scope, receive, send)
@@ -0,0 +1,166 @@
+"""
+Inference backends for the YOLO vehicle/animal detector.
+
+Every backend exposes predict(frames) returning, per frame, a tuple of NumPy
+arrays (xyxy, conf, cls) in original frame pixel coordinates, so detect.py can
+map them onto CLASS_NAMES the same way whichever runtime produced them.
+
+Select the backend with DETECT_BACKEND:
+    ultralytics  PyTorch through the ultralytics package (default)
+    onnx         ONNX Runtime on the exported model; set ONNX_PROVIDERS to e.g.
+                 "OpenVINOExecutionProvider,CPUExecutionProvider" to run it via OpenVINO
+"""
+import os
+
+import cv2
+import numpy as np
+
+YOLO_WEIGHTS = os.getenv('YOLO_WEIGHTS', 'yolov8n.pt')  # nano model for speed, use 'yolov8s.pt' or 'yolov8m.pt' for better accuracy
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+
+
+class UltralyticsBackend:
+    """YOLO through PyTorch/ultralytics."""
+
+    name = 'ultralytics'
+
+    def __init__(self, weights=YOLO_WEIGHTS):
+        from ultralytics import YOLO
+        # Load YOLOv8 model (will download automatically on first run)
+        self.model = YOLO(weights)
+
+    def predict(self, frames):
+        results = self.model(list(frames), verbose=False, conf=CONF_THRESHOLD)
+        outputs = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                outputs.append(empty_output())
+                continue
+            # One device->host transfer per frame instead of three per box
+            outputs.append((boxes.xyxy.cpu().numpy(),
+                            boxes.conf.cpu().numpy(),
+                            boxes.cls.cpu().numpy().astype(np.int64)))
+        return outputs
+
+
+class OnnxBackend:
+    """YOLOv8 exported to ONNX and run with ONNX Runtime (optionally INT8-quantized)."""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, providers=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = ort.get_available_providers()
+        providers = [p for p in (providers or ['CPUExecutionProvider']) if p in available] or ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(model_path, options, providers=providers)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        # Models exported without dynamic=True only take a batch of one
+        self.batchable = not isinstance(model_input.shape[0], int)
+
+    def _letterbox(self, frame):
+        """Resize keeping aspect ratio and pad to imgsz x imgsz. Returns (image, ratio, (pad_x, pad_y))."""
+        h, w = frame.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x, pad_y = (self.imgsz - new_w) // 2, (self.imgsz - new_h) // 2
+        image = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        image[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        return image, ratio, (pad_x, pad_y)
+
+    def predict(self, frames):
+        boxed = [self._letterbox(frame) for frame in frames]
+        images = [image for image, _, _ in boxed]
+        if self.batchable:
+            blob = cv2.dnn.blobFromImages(images, 1 / 255.0, swapRB=True)
+            preds = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            preds = np.concatenate([
+                self.session.run(None, {self.input_name: cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True)})[0]
+                for image in images])
+
+        outputs = []
+        for pred, frame, (_, ratio, pad) in zip(preds, frames, boxed):
+            outputs.append(self._decode(pred, ratio, pad, frame.shape))
+        return outputs
+
+    def _decode(self, pred, ratio, pad, shape):
+        # YOLOv8 head: (4 + num_classes, anchors) with boxes as cx, cy, w, h
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= CONF_THRESHOLD
+        if not keep.any():
+            return empty_output()
+        pred, cls, conf = pred[keep], cls[keep], conf[keep]
+
+        xywh = pred[:, :4].copy()
+        xywh[:, 0] -= xywh[:, 2] / 2
+        xywh[:, 1] -= xywh[:, 3] / 2
+        # Class-aware NMS: shift each class into its own coordinate range
+        offset = (cls * 4096.0)[:, None]
+        shifted = xywh.copy()
+        shifted[:, :2] += offset
+        indices = cv2.dnn.NMSBoxes(shifted.tolist(), conf.tolist(), CONF_THRESHOLD, IOU_THRESHOLD)
+        indices = np.array(indices, dtype=np.int64).reshape(-1)
+
+        xywh, conf, cls = xywh[indices], conf[indices], cls[indices]
+        xyxy = np.empty_like(xywh)
+        xyxy[:, 0] = (xywh[:, 0] - pad[0]) / ratio
+        xyxy[:, 1] = (xywh[:, 1] - pad[1]) / ratio
+        xyxy[:, 2] = (xywh[:, 0] + xywh[:, 2] - pad[0]) / ratio
+        xyxy[:, 3] = (xywh[:, 1] + xywh[:, 3] - pad[1]) / ratio
+        h, w = shape[:2]
+        xyxy[:, [0, 2]] = np.clip(xyxy[:, [0, 2]], 0, w - 1)
+        xyxy[:, [1, 3]] = np.clip(xyxy[:, [1, 3]], 0, h - 1)
+        return xyxy, conf.astype(np.float32), cls.astype(np.int64)
+
+
+def empty_output():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+
+def export_onnx(weights=YOLO_WEIGHTS, int8=False):
+    """
+    Export the PyTorch weights to ONNX (dynamic batch) and optionally write an
+    INT8 dynamically-quantized copy next to it. Returns the path to use.
+    """
+    from ultralytics import YOLO
+    path = YOLO(weights).export(format='onnx', dynamic=True)
+    if not int8:
+        return path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    int8_path = os.path.splitext(path)[0] + '.int8.onnx'
+    quantize_dynamic(path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def onnx_model_path():
+    """Configured ONNX model, exporting it from the PyTorch weights if it does not exist yet."""
+    int8 = os.getenv('ONNX_INT8', '0') == '1'
+    default = os.path.splitext(YOLO_WEIGHTS)[0] + ('.int8.onnx' if int8 else '.onnx')
+    path = os.getenv('ONNX_MODEL', default)
+    if not os.path.exists(path):
+        print(f"ONNX model {path} not found, exporting from {YOLO_WEIGHTS}...")
+        path = export_onnx(YOLO_WEIGHTS, int8=int8)
+    return path
+
+
+def load_backend(name=None):
+    """Create the backend selected by DETECT_BACKEND (or `name`)."""
+    name = (name or os.getenv('DETECT_BACKEND', 'ultralytics')).strip().lower()
+    if name == 'onnx':
+        providers = [p.strip() for p in os.getenv('ONNX_PROVIDERS', 'CPUExecutionProvider').split(',') if p.strip()]
+        return OnnxBackend(onnx_model_path(), providers)
+    if name == 'ultralytics':
+        return UltralyticsBackend()
+    raise ValueError(f"Unknown DETECT_BACKEND: {name}")
+
@@ -0,0 +1,209 @@
+"""
+Offline detection over recorded crossing footage.
+
+    python batch_process.py crossing.mp4 --output crossing.npz --video crossing_annotated.mp4
+    python batch_process.py frames_dir/ --output counts.csv --workers 8
+
+The input (a video file or a directory of images) is split into chunks of
+consecutive frames. Each worker process loads the models once, decodes its own
+chunks (seeking in the video) and runs the same detection as the live app, so
+decoding and detection both scale with the number of cores.
+
+Results are written column-wise:
+    .npz  one array per column; boxes in box_* arrays
+    .csv  per-frame counts in the given file, boxes in <name>_boxes.csv
+A throughput report (frames/s and speed relative to real time) is printed as JSON.
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_chunks(source, chunk_size):
+    """Split the input into work items. Returns (chunks, total frames, source fps)."""
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        paths = [os.path.join(source, n) for n in names]
+        chunks = [('images', i, paths[i:i + chunk_size]) for i in range(0, len(paths), chunk_size)]
+        return chunks, len(paths), None
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open {source}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or None
+    cap.release()
+    if total <= 0:
+        # Unknown length (e.g. some streams): a single worker reads it to the end
+        return [('video', 0, (source, 0, None))], None, fps
+    chunks = [('video', start, (source, start, min(start + chunk_size, total)))
+              for start in range(0, total, chunk_size)]
+    return chunks, total, fps
+
+
+def read_chunk(kind, first, payload):
+    """Yield (frame index, frame) for the frames of one work item; unreadable images are skipped."""
+    if kind == 'images':
+        for index, path in enumerate(payload, first):
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Skipping unreadable image {path}", file=sys.stderr)
+                continue
+            yield index, frame
+        return
+
+    source, start, end = payload
+    cap = cv2.VideoCapture(source)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    while end is None or index < end:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield index, frame
+        index += 1
+    cap.release()
+
+
+def _init_worker():
+    import detect
+    # One process per core already; OpenCV's own threads would only compete
+    cv2.setNumThreads(1)
+    detect.load_models()
+
+
+def process_chunk(task):
+    """Worker: detect on every frame of a chunk. Returns (frame indices, counts, boxes, annotated frames)."""
+    import detect
+    from pipeline import draw_counts
+
+    (kind, first, payload), batch, annotate = task
+    indices = []
+    counts_rows = []
+    boxes = []
+    annotated = []
+    pending = []
+
+    def flush():
+        frames = [frame for _, frame in pending]
+        # No sources: recorded frames keep no per-camera state between calls
+        results = detect.analyze_batch(frames, sources=[None] * len(frames))
+        for (index, frame), (fps, counts, detections) in zip(pending, results):
+            indices.append(index)
+            counts_rows.append(counts)
+            for det in detections:
+                boxes.append((index, det.kind, det.label, det.x1, det.y1, det.x2, det.y2,
+                              -1.0 if det.conf is None else float(det.conf)))
+            if annotate:
+                detect.render_detections(frame, detections, counts)
+                draw_counts(frame, fps, counts)
+                annotated.append(frame)
+        pending.clear()
+
+    for item in read_chunk(kind, first, payload):
+        pending.append(item)
+        if len(pending) >= batch:
+            flush()
+    if pending:
+        flush()
+    return indices, counts_rows, boxes, annotated
+
+
+def write_results(path, frames, times, counts, boxes):
+    """Write per-frame counts (named as in /stats) and boxes column-wise to .npz or .csv."""
+    from pipeline import STAT_KEYS
+
+    columns = {"frame": np.asarray(frames, dtype=np.int64)}
+    if times is not None:
+        columns["time_s"] = np.asarray(times, dtype=np.float64)
+    for name, key in STAT_KEYS.items():
+        columns[key] = np.asarray([row.get(name, 0) for row in counts], dtype=np.int32)
+
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(columns))
+            writer.writerows(zip(*(values.tolist() for values in columns.values())))
+        boxes_path = os.path.splitext(path)[0] + '_boxes.csv'
+        with open(boxes_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "kind", "label", "x1", "y1", "x2", "y2", "conf"])
+            writer.writerows(boxes)
+        return [path, boxes_path]
+
+    box_cols = list(zip(*boxes)) if boxes else [()] * 8
+    np.savez_compressed(
+        path,
+        **columns,
+        box_frame=np.asarray(box_cols[0], dtype=np.int64),
+        box_kind=np.asarray(box_cols[1], dtype=str),
+        box_label=np.asarray(box_cols[2], dtype=str),
+        box_xyxy=np.asarray(list(zip(*box_cols[3:7])), dtype=np.int32).reshape(-1, 4),
+        box_conf=np.asarray(box_cols[7], dtype=np.float32),
+    )
+    return [path if path.endswith('.npz') else path + '.npz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run crossing detection over recorded footage")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--output", default="detections.npz", help="results file (.npz or .csv)")
+    parser.add_argument("--video", help="also write an annotated video to this file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=64, help="consecutive frames per work item")
+    parser.add_argument("--batch", type=int, default=8, help="frames per detection call (YOLO batch)")
+    args = parser.parse_args()
+
+    chunks, _, source_fps = list_chunks(args.source, args.chunk)
+    if not chunks:
+        parser.error(f"no frames found in {args.source}")
+
+    started = time.perf_counter()
+    frames, counts, boxes = [], [], []
+    writer = None
+    tasks = [(chunk, args.batch, bool(args.video)) for chunk in chunks]
+    with mp.get_context('spawn').Pool(args.workers, initializer=_init_worker) as pool:
+        # imap keeps chunk order, so the annotated video is written sequentially
+        for done, (indices, chunk_counts, chunk_boxes, annotated) in enumerate(pool.imap(process_chunk, tasks), 1):
+            frames.extend(indices)
+            counts.extend(chunk_counts)
+            boxes.extend(chunk_boxes)
+            for frame in annotated:
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(args.video, cv2.VideoWriter_fourcc(*'mp4v'), source_fps or 25.0, (w, h))
+                writer.write(frame)
+            print(f"{done}/{len(tasks)} chunks, {len(frames)} frames", file=sys.stderr)
+    if writer is not None:
+        writer.release()
+    elapsed = time.perf_counter() - started
+
+    times = [index / source_fps for index in frames] if source_fps else None
+    outputs = write_results(args.output, frames, times, counts, boxes)
+
+    throughput = len(frames) / elapsed if elapsed > 0 else None
+    report = {
+        "source": args.source,
+        "frames": len(frames),
+        "workers": args.workers,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_fps": round(throughput, 2) if throughput else None,
+        "source_fps": source_fps,
+        "realtime_factor": round(throughput / source_fps, 2) if throughput and source_fps else None,
+        "outputs": outputs + ([args.video] if args.video else []),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Detection benchmarks.
+
+    python benchmark.py stages [--source PATH] [--output report.json] [--baseline old.json]
+    python benchmark.py backends [--source PATH] [--backends ultralytics,onnx] [--batch 4]
+    python benchmark.py hog [--source PATH] [--config 0.5,8,1.1,25 ...]
+
+Frames come from a video file, a directory of images, or (default) the
+synthetic sample stream. Results are printed as JSON. With --baseline the
+stages run exits non-zero when any stage's p95 regressed by more than
+--tolerance, so it can gate a deploy.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import backends
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_frames(source=None, limit=100):
+    """Up to `limit` BGR frames from a video file, an image directory or the sample stream."""
+    if source is None:
+        from pipeline import sample_frame
+        return [sample_frame(i * 8) for i in range(limit)]
+
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        frames = [cv2.imread(os.path.join(source, n)) for n in names[:limit]]
+        return [f for f in frames if f is not None]
+
+    frames = []
+    cap = cv2.VideoCapture(source)
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def summarize(latencies_ms, frames_per_call=1):
+    """Latency percentiles (ms) and throughput (frames/s) for a list of per-call timings."""
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    if values.size == 0:
+        return {"calls": 0}
+    return {
+        "calls": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "throughput_fps": round(frames_per_call * 1000.0 / float(values.mean()), 2) if values.mean() > 0 else None,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0, 1)
+
+
+def pipeline_stages():
+    """Stage name -> function(frame) for every step of detecting and streaming one frame."""
+    import detect
+    from pipeline import draw_counts
+
+    detect.load_models()
+
+    def yolo(frame):
+        if detect.yolo_backend is not None:
+            detect.apply_yolo_result(detect.yolo_backend.predict([frame])[0], detect.new_counts())
+
+    def render(frame):
+        fps, counts, detections = detect.analyze_batch([frame])[0]
+        started = time.perf_counter()
+        out = frame.copy()
+        detect.render_detections(out, detections, counts)
+        draw_counts(out, fps, counts)
+        return time.perf_counter() - started
+
+    stages = {
+        "face_cascade": lambda frame: detect.detect_faces(frame, detect.new_counts()),
+        "hog_fallback": lambda frame: detect.detect_humans_hog(frame, detect.new_counts()),
+        "zebra_crossing": detect.detect_zebra_crossing,
+        "footpath": detect.detect_footpath,
+        # render times only the drawing, not the detection feeding it
+        "render": render,
+        "jpeg_encode": lambda frame: cv2.imencode(".jpg", frame),
+        "detect_total": lambda frame: detect.analyze_batch([frame]),
+    }
+    if detect.yolo_backend is not None:
+        stages["yolo"] = yolo
+    return stages
+
+
+def bench_stages(frames, names=None, warmup=3):
+    """Per-stage latency percentiles and throughput over the same frames."""
+    stages = pipeline_stages()
+    report = {}
+    for name, fn in stages.items():
+        if names and name not in names:
+            continue
+        for frame in frames[:warmup]:
+            fn(frame)
+        latencies = []
+        for frame in frames:
+            started = time.perf_counter()
+            inner = fn(frame)
+            elapsed = time.perf_counter() - started
+            # Stages may report their own timing when they need setup work first
+            latencies.append((inner if isinstance(inner, float) else elapsed) * 1000)
+        report[name] = summarize(latencies)
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Stages whose p95 grew by more than `tolerance` (fraction) over the baseline report."""
+    regressions = {}
+    for name, stats in report.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(name, {}).get("p95_ms")
+        new = stats.get("p95_ms")
+        if old and new and new > old * (1 + tolerance):
+            regressions[name] = {"baseline_p95_ms": old, "p95_ms": new}
+    return regressions
+
+
+def bench_backends(frames, names, batch=1, warmup=3):
+    """Side-by-side latency of each inference backend on the same frames."""
+    report = {}
+    batches = [frames[i:i + batch] for i in range(0, len(frames) - batch + 1, batch)]
+    for name in names:
+        try:
+            started = time.perf_counter()
+            backend = backends.load_backend(name)
+            load_s = time.perf_counter() - started
+        except Exception as e:
+            report[name] = {"error": str(e)}
+            continue
+
+        for chunk in batches[:warmup]:
+            backend.predict(chunk)
+        latencies = []
+        detections = 0
+        for chunk in batches:
+            started = time.perf_counter()
+            outputs = backend.predict(chunk)
+            latencies.append((time.perf_counter() - started) * 1000)
+            detections += sum(len(cls) for _, _, cls in outputs)
+
+        report[name] = dict(summarize(latencies, batch), load_s=round(load_s, 3), batch=batch, detections=detections)
+    return report
+
+
+# HOG fallback settings compared by the hog benchmark:
+# name -> (scale, stride, pyramid scale, motion threshold); None is the full-resolution original
+HOG_CONFIGS = {
+    "full": None,
+    "scale0.75_stride8": (0.75, 8, 1.05, 0),
+    "scale0.5_stride8": (0.5, 8, 1.1, 0),
+    "scale0.5_stride8_motion": (0.5, 8, 1.1, 25),
+}
+
+
+def parse_hog_config(text):
+    """'scale,stride,pyramid,motion' -> (name, settings tuple)."""
+    scale, stride, pyramid, motion = text.split(",")
+    settings = (float(scale), int(stride), float(pyramid), int(motion))
+    return f"scale{scale}_stride{stride}_pyramid{pyramid}_motion{motion}", settings
+
+
+def matched_boxes(reference, boxes, min_iou=0.5):
+    """Number of reference boxes overlapped by some box with IoU >= min_iou."""
+    if not reference or not boxes:
+        return 0
+    a = np.asarray(reference, dtype=np.float64)[:, None]
+    b = np.asarray(boxes, dtype=np.float64)[None]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area = lambda box: (box[..., 2] - box[..., 0]) * (box[..., 3] - box[..., 1])
+    iou = inter / np.maximum(area(a) + area(b) - inter, 1e-9)
+    return int((iou.max(axis=1) >= min_iou).sum())
+
+
+def bench_hog(frames, configs, warmup=3):
+    """
+    Latency of each HOG fallback setting, and how many of the people found by the
+    full-resolution original it still finds (recall_vs_full). Frames are fed in
+    order as one camera, so motion-gated settings see real frame-to-frame changes.
+    """
+    import detect
+
+    detect.load_models()
+    reference = None
+    report = {}
+    for name, settings in configs.items():
+        if settings is None:
+            options = {"mode": "full"}
+        else:
+            scale, stride, pyramid, motion = settings
+            options = {"mode": "fast", "scale": scale, "stride": stride, "pyramid": pyramid,
+                       "motion_threshold": motion}
+        source = f"benchmark-{name}"
+        detect._hog_state.pop(source, None)
+        for frame in frames[:warmup]:
+            detect.hog_people(frame, **options)
+
+        latencies = []
+        found = []
+        for frame in frames:
+            started = time.perf_counter()
+            found.append(detect.hog_people(frame, source, **options))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        stats = dict(summarize(latencies), people=sum(len(boxes) for boxes in found))
+        if reference is None:
+            reference = found
+        else:
+            total = sum(len(boxes) for boxes in reference)
+            hits = sum(matched_boxes(ref, boxes) for ref, boxes in zip(reference, found))
+            stats["recall_vs_full"] = round(hits / total, 3) if total else None
+        report[name] = stats
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("stages", help="per-stage latency of the detection pipeline")
+    p.add_argument("--source", help="video file or image directory (default: synthetic sample stream)")
+    p.add_argument("--frames", type=int, default=100)
+    p.add_argument("--stages", help="comma-separated subset of stages to run")
+    p.add_argument("--output", help="also write the JSON report to this file")
+    p.add_argument("--baseline", help="previous report to check for p95 regressions")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline (fraction)")
+
+    p = sub.add_parser("backends", help="compare YOLO inference backends")
+    p.add_argument("--source", help="video file or image directory (default: synthetic sample stream)")
+    p.add_argument("--frames", type=int, default=100)
+    p.add_argument("--backends", default="ultralytics,onnx")
+    p.add_argument("--batch", type=int, default=1)
+
+    p = sub.add_parser("hog", help="latency/recall trade-off of the HOG fallback settings")
+    p.add_argument("--source", help="video file or image directory (default: synthetic sample stream)")
+    p.add_argument("--frames", type=int, default=100)
+    p.add_argument("--config", action="append", default=[],
+                   help="extra setting to compare as scale,stride,pyramid,motion (repeatable)")
+
+    args = parser.parse_args()
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        parser.error(f"no frames could be read from {args.source}")
+
+    exit_code = 0
+    if args.command == "stages":
+        names = [n.strip() for n in args.stages.split(",")] if args.stages else None
+        report = {
+            "source": args.source or "sample",
+            "frames": len(frames),
+            "resolution": list(frames[0].shape[1::-1]),
+            "stages": bench_stages(frames, names),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if args.baseline:
+            with open(args.baseline) as f:
+                report["regressions"] = compare_to_baseline(report, json.load(f), args.tolerance)
+            exit_code = 1 if report["regressions"] else 0
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    elif args.command == "hog":
+        configs = dict(HOG_CONFIGS)
+        configs.update(parse_hog_config(text) for text in args.config)
+        report = {
+            "source": args.source or "sample",
+            "frames": len(frames),
+            "configs": bench_hog(frames, configs),
+        }
+    else:
+        names = [n.strip() for n in args.backends.split(",") if n.strip()]
+        report = bench_backends(frames, names, args.batch)
+        report["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(report, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
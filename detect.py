@@ -1,62 +1,118 @@
 import cv2
 import time
+import threading
 import numpy as np
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 
-# Try to import YOLO
-YOLO_AVAILABLE = False
-yolo_model = None
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-    print("YOLO library imported successfully")
-except ImportError as e:
-    print(f"Warning: YOLO not available. Install ultralytics for advanced detection. Error: {e}")
-except Exception as e:
-    print(f"Warning: YOLO failed to initialize. Using basic detection only. Error: {e}")
+import metrics
+from backends import load_backend
+from preprocess import context_for
 
 # Simple FPS tracking
 last_time = time.time()
 frame_count = 0
 fps = 0
 
-# Initialize YOLO model (only if YOLO is available)
-if YOLO_AVAILABLE:
+# Models are loaded lazily (see load_models/start_loading) so importing this
+# module never waits on torch; detectors skip whatever is not loaded yet
+YOLO_AVAILABLE = False
+yolo_backend = None
+hog = None
+face_cascade = None
+
+# Readiness state reported by /ready
+_load_lock = threading.Lock()
+_load_thread = None
+MODEL_STEPS = ('face_cascade', 'hog', 'yolo')
+model_status = {
+    "state": "idle",  # idle -> loading -> ready
+    "loaded": [],
+    "progress": 0.0,
+    "yolo_backend": None,
+    "error": None,
+}
+
+def _step_done(name):
+    model_status["loaded"].append(name)
+    model_status["progress"] = round(len(model_status["loaded"]) / len(MODEL_STEPS), 2)
+
+def _load_face_cascade():
+    global face_cascade
+    possible_paths = [
+        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml',
+        cv2.data.haarcascades + 'haarcascade_frontalface_alt.xml',
+        'haarcascade_frontalface_default.xml'
+    ]
+    
+    cascade = None
+    for path in possible_paths:
+        if os.path.exists(path):
+            cascade = cv2.CascadeClassifier(path)
+            if not cascade.empty():
+                print(f"Face cascade loaded from: {path}")
+                break
+    
+    if cascade is None or cascade.empty():
+        try:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        except:
+            pass
+    face_cascade = cascade
+
+def _load_hog():
+    global hog
+    # Initialize HOG descriptor for human detection (fallback)
+    descriptor = cv2.HOGDescriptor()
+    descriptor.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    hog = descriptor
+
+def _load_yolo():
+    global yolo_backend, YOLO_AVAILABLE
+    # Initialize the YOLO backend selected by DETECT_BACKEND (see backends.py)
     try:
-        # Load YOLOv8 model (will download automatically on first run)
         print("Loading YOLO model...")
-        yolo_model = YOLO('yolov8n.pt')  # nano model for speed, use 'yolov8s.pt' or 'yolov8m.pt' for better accuracy
-        print("YOLO model loaded successfully!")
+        yolo_backend = load_backend()
+        YOLO_AVAILABLE = True
+        model_status["yolo_backend"] = yolo_backend.name
+        print(f"YOLO model loaded successfully! (backend: {yolo_backend.name})")
+    except ImportError as e:
+        model_status["error"] = str(e)
+        print(f"Warning: YOLO not available. Install ultralytics for advanced detection. Error: {e}")
     except Exception as e:
+        model_status["error"] = str(e)
         print(f"Error loading YOLO model: {e}")
         print("Falling back to basic detection (faces and humans only)")
-        YOLO_AVAILABLE = False
-        yolo_model = None
 
-# Initialize HOG descriptor for human detection (fallback)
-hog = cv2.HOGDescriptor()
-hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+def load_models():
+    """Load the face cascade, HOG detector and YOLO backend (blocking, idempotent)."""
+    with _load_lock:
+        if model_status["state"] == "ready":
+            return
+        model_status["state"] = "loading"
+        # Cheap classical detectors first so they work while YOLO is still loading
+        _load_face_cascade()
+        _step_done('face_cascade')
+        _load_hog()
+        _step_done('hog')
+        _load_yolo()
+        _step_done('yolo')
+        model_status["state"] = "ready"
 
-# Initialize face cascade classifier
-face_cascade = None
-possible_paths = [
-    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml',
-    cv2.data.haarcascades + 'haarcascade_frontalface_alt.xml',
-    'haarcascade_frontalface_default.xml'
-]
+def start_loading():
+    """Load models on a background thread so the web app can serve requests immediately."""
+    global _load_thread
+    if _load_thread is None and model_status["state"] == "idle":
+        _load_thread = threading.Thread(target=load_models, name="model-loader", daemon=True)
+        _load_thread.start()
 
-for path in possible_paths:
-    if os.path.exists(path):
-        face_cascade = cv2.CascadeClassifier(path)
-        if not face_cascade.empty():
-            print(f"Face cascade loaded from: {path}")
-            break
+def models_ready():
+    return model_status["state"] == "ready"
 
-if face_cascade is None or face_cascade.empty():
-    try:
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    except:
-        pass
+# Detectors within a frame run on this many threads; 0 or 1 runs them sequentially
+DETECT_THREADS = int(os.getenv('DETECT_THREADS', '0'))
+_executor = None
+_executor_lock = threading.Lock()
 
 # Object class mapping for YOLO COCO dataset
 # YOLO can detect: vehicles, animals, and many other objects
@@ -95,72 +151,207 @@ COLOR_MAP = {
     'bullock_cart': (200, 100, 0),    # Orange-brown
 }
 
-def detect_zebra_crossing(frame):
-    """Detect zebra crossing using line detection"""
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+# Categories counted from YOLO boxes: (counts key, box label, COLOR_MAP key)
+YOLO_CATEGORIES = [
+    ("Cars", "Car", 'car'),
+    ("Motorcycles", "Motorcycle", 'motorcycle'),
+    ("Buses", "Bus", 'bus'),
+    ("Trucks", "Truck", 'truck'),
+    ("Traffic_Lights", "Traffic Light", 'traffic_light'),
+    ("Dogs", "Dog", 'dog'),
+    ("Cats", "Cat", 'cat'),
+    ("Cows", "Cow", 'cow'),
+    ("Horses", "Horse", 'horse'),
+    ("Humans", "Person", 'person'),
+    # Map sheep to buffalo for rural context
+    ("Buffaloes", "Buffalo", 'buffalo'),
+]
+
+# CLASS_NAMES value -> index into YOLO_CATEGORIES
+CLASS_CATEGORY = {
+    'car': 0, 'motorcycle': 1, 'bus': 2, 'truck': 3, 'traffic_light': 4,
+    'dog': 5, 'cat': 6, 'cow': 7, 'horse': 8, 'person': 9, 'sheep': 10,
+}
+
+# Class id -> category index lookup array built from CLASS_NAMES (-1 = ignored class)
+CATEGORY_LOOKUP = np.full(max(CLASS_NAMES) + 1, -1, dtype=np.int64)
+for _cls_id, _name in CLASS_NAMES.items():
+    CATEGORY_LOOKUP[_cls_id] = CLASS_CATEGORY[_name]
+
+# Categories that also count towards "Vehicles"
+VEHICLE_CATEGORIES = np.array([0, 1, 2, 3])
+
+class Detection:
+    """
+    One detected object, kept as a compact __slots__ record.
+    kind is a COLOR_MAP key; for 'zebra_crossing' the coordinates are the
+    endpoints of a stripe line rather than a box. conf is None for classical detectors.
+    """
+    __slots__ = ('kind', 'label', 'x1', 'y1', 'x2', 'y2', 'conf')
+
+    def __init__(self, kind, label, x1, y1, x2, y2, conf=None):
+        self.kind = kind
+        self.label = label
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+        self.conf = conf
+
+    def to_dict(self):
+        return {"kind": self.kind, "label": self.label,
+                "box": [self.x1, self.y1, self.x2, self.y2], "conf": self.conf}
+
+def _parse_roi(value):
+    x0, y0, x1, y1 = (float(v) for v in value.split(','))
+    return x0, y0, x1, y1
+
+# Zebra crossings only appear on the road surface: search this part of the frame
+# (x0,y0,x1,y1 as fractions) at ZEBRA_SCALE of the full resolution
+ZEBRA_ROI = _parse_roi(os.getenv('ZEBRA_ROI', '0,0.4,1,1'))
+ZEBRA_SCALE = float(os.getenv('ZEBRA_SCALE', '0.5'))
+# The road does not move: reuse a camera's last result for up to ZEBRA_CACHE_SECONDS
+# while its ROI changed by less than ZEBRA_CACHE_THRESHOLD grey levels on average
+ZEBRA_CACHE_SECONDS = float(os.getenv('ZEBRA_CACHE_SECONDS', '1.0'))
+ZEBRA_CACHE_THRESHOLD = float(os.getenv('ZEBRA_CACHE_THRESHOLD', '6.0'))
+_zebra_cache = {}  # source -> (computed_at, thumbnail, result)
+
+def detect_zebra_crossing(frame, source=None, ctx=None):
+    """
+    Detect zebra crossing using line detection.
+    With a `source`, the result is cached per camera (see ZEBRA_CACHE_SECONDS).
+    `ctx` is the frame's shared FrameContext, if the caller has one.
+    Returns: (found, stripe line detections)
+    """
+    h, w = frame.shape[:2]
+    x0, y0 = int(w * ZEBRA_ROI[0]), int(h * ZEBRA_ROI[1])
+    x1, y1 = int(w * ZEBRA_ROI[2]), int(h * ZEBRA_ROI[3])
+    if x1 <= x0 or y1 <= y0:
+        return False, []
+    ctx = ctx or context_for(frame)
+    box = (x0, y0, x1, y1)
+    scale = ZEBRA_SCALE
+    gray = ctx.gray_region(box, scale)
+    
+    if source is not None and ZEBRA_CACHE_SECONDS > 0:
+        thumb = cv2.resize(gray, (64, 32), interpolation=cv2.INTER_AREA)
+        cached = _zebra_cache.get(source)
+        if (cached is not None and time.time() - cached[0] < ZEBRA_CACHE_SECONDS
+                and cached[1].shape == thumb.shape
+                and cv2.absdiff(thumb, cached[1]).mean() < ZEBRA_CACHE_THRESHOLD):
+            return cached[2]
+    
     # Apply edge detection
-    edges = cv2.Canny(gray, 50, 150)
-    # Detect horizontal lines (zebra crossing stripes)
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, 100, minLineLength=100, maxLineGap=10)
+    edges = ctx.edges(box, scale, 50, 150)
+    # Detect horizontal lines (zebra crossing stripes); length thresholds follow the scale
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, max(1, int(100 * scale)),
+                            minLineLength=100 * scale, maxLineGap=10 * scale)
     
+    stripes = []
     if lines is not None:
-        horizontal_lines = 0
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            # Check if line is roughly horizontal
-            if abs(y2 - y1) < 20 and abs(x2 - x1) > 50:
-                horizontal_lines += 1
-                cv2.line(frame, (x1, y1), (x2, y2), COLOR_MAP['zebra_crossing'], 2)
-        
-        return horizontal_lines >= 5  # If we find 5+ horizontal lines, likely a zebra crossing
-    return False
-
-def detect_footpath(frame):
-    """Detect footpath/sidewalk using color and texture analysis"""
-    # Convert to HSV for better color detection
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        lines = lines.reshape(-1, 4)
+        # Keep roughly horizontal lines
+        dx = np.abs(lines[:, 2] - lines[:, 0])
+        dy = np.abs(lines[:, 3] - lines[:, 1])
+        lines = lines[(dy < 20 * scale) & (dx > 50 * scale)]
+        # Back to full-frame coordinates
+        coords = (lines / scale).astype(np.int64) + (x0, y0, x0, y0)
+        stripes = [Detection('zebra_crossing', None, *line) for line in coords.tolist()]
+    
+    result = (len(stripes) >= 5, stripes)  # If we find 5+ horizontal lines, likely a zebra crossing
+    if source is not None and ZEBRA_CACHE_SECONDS > 0:
+        _zebra_cache[source] = (time.time(), thumb, result)
+    return result
+
+# Footpaths are typically gray/concrete colored
+FOOTPATH_LOWER = np.array([0, 0, 50])
+FOOTPATH_UPPER = np.array([180, 50, 200])
+FOOTPATH_MIN_AREA = 5000  # full-resolution pixels
+
+# "fast" segments a downscaled lower band of the frame and keeps a smoothed mask per
+# camera that is only recomputed every FOOTPATH_INTERVAL seconds; "full" is the
+# original full-frame contour search
+FOOTPATH_MODE = os.getenv('FOOTPATH_MODE', 'fast')
+FOOTPATH_BAND = float(os.getenv('FOOTPATH_BAND', '0.5'))  # top of the searched band, fraction of height
+FOOTPATH_SCALE = float(os.getenv('FOOTPATH_SCALE', '0.25'))
+FOOTPATH_INTERVAL = float(os.getenv('FOOTPATH_INTERVAL', '0.5'))
+FOOTPATH_SMOOTHING = float(os.getenv('FOOTPATH_SMOOTHING', '0.3'))  # weight of the newest mask
+_footpath_state = {}  # source -> (smoothed mask, computed_at, detections)
+
+def detect_footpath(frame, source=None, ctx=None):
+    """
+    Detect footpath/sidewalk using color and texture analysis.
+    With a `source`, the mask is smoothed over time and the result reused
+    between recomputations (fast mode).
+    `ctx` is the frame's shared FrameContext, if the caller has one.
+    Returns: list of footpath detections (empty if none)
+    """
+    ctx = ctx or context_for(frame)
+    if FOOTPATH_MODE == 'full':
+        return _detect_footpath_full(frame, ctx)
     
-    # Footpaths are typically gray/concrete colored
-    # Define range for gray colors
-    lower_gray = np.array([0, 0, 50])
-    upper_gray = np.array([180, 50, 200])
+    state = _footpath_state.get(source) if source is not None else None
+    now = time.time()
+    if state is not None and now - state[1] < FOOTPATH_INTERVAL:
+        return state[2]
     
-    mask = cv2.inRange(hsv, lower_gray, upper_gray)
+    h, w = frame.shape[:2]
+    top = int(h * FOOTPATH_BAND)
+    scale = FOOTPATH_SCALE
+    if top >= h:
+        return []
+    hsv = ctx.hsv_region((0, top, w, h), scale)
+    mask = cv2.inRange(hsv, FOOTPATH_LOWER, FOOTPATH_UPPER)
+    
+    if source is not None:
+        # Exponentially smoothed mask, so one odd frame does not make the footpath flicker
+        if state is None or state[0].shape != mask.shape:
+            smoothed = mask.astype(np.float32)
+        else:
+            smoothed = state[0]
+            cv2.accumulateWeighted(mask, smoothed, FOOTPATH_SMOOTHING)
+        mask = cv2.compare(smoothed, 127.5, cv2.CMP_GE)
+    
+    # Component statistics for all regions at once instead of a per-contour loop
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]  # label 0 is the background
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    bw, bh = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    bottom = (y + bh) / scale + top
+    # Large enough to be a footpath, and reaching the bottom of the frame (typical footpath location)
+    keep = (stats[:, cv2.CC_STAT_AREA] > FOOTPATH_MIN_AREA * scale * scale) & (bottom > h * 0.6)
+    boxes = np.stack([x / scale, y / scale + top, (x + bw) / scale, bottom], axis=1)[keep]
+    boxes = np.minimum(boxes, (w, h, w, h)).astype(np.int64)
+    footpaths = [Detection('footpath', "Footpath", *box) for box in boxes.tolist()]
+    
+    if source is not None:
+        _footpath_state[source] = (smoothed, now, footpaths)
+    return footpaths
+
+def _detect_footpath_full(frame, ctx):
+    # Convert to HSV for better color detection
+    h, w = frame.shape[:2]
+    hsv = ctx.hsv_region((0, 0, w, h))
+    
+    mask = cv2.inRange(hsv, FOOTPATH_LOWER, FOOTPATH_UPPER)
     
     # Find contours
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    footpath_detected = False
+    footpaths = []
     for contour in contours:
         area = cv2.contourArea(contour)
-        if area > 5000:  # Large enough to be a footpath
+        if area > FOOTPATH_MIN_AREA:  # Large enough to be a footpath
             x, y, w, h = cv2.boundingRect(contour)
             # Check if it's at the bottom of frame (typical footpath location)
             if y + h > frame.shape[0] * 0.6:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), COLOR_MAP['footpath'], 2)
-                cv2.putText(frame, "Footpath", (x, y - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR_MAP['footpath'], 2)
-                footpath_detected = True
+                footpaths.append(Detection('footpath', "Footpath", x, y, x + w, y + h))
     
-    return footpath_detected
+    return footpaths
 
-def detect_objects(frame):
-    """
-    Detect multiple object types: vehicles, animals, traffic lights, zebra crossings, footpaths, faces, and humans.
-    Returns: (frame, fps, counts_dict)
-    """
-    global last_time, frame_count, fps
-    
-    # Simple FPS calculation
-    frame_count += 1
-    current_time = time.time()
-    if current_time - last_time >= 1.0:
-        fps = frame_count
-        frame_count = 0
-        last_time = current_time
-    
-    # Initialize counts
-    counts = {
+def new_counts():
+    """Zeroed counts dict in the order the overlay displays it."""
+    return {
         "Faces": 0,
         "Humans": 0,
         "Vehicles": 0,
@@ -178,12 +369,13 @@ def detect_objects(frame):
         "Buffaloes": 0,
         "Bullock_Carts": 0
     }
-    
-    # Face detection (using Haar Cascade)
-    face_count = 0
+
+def detect_faces(frame, counts, ctx=None):
+    """Face detection (using Haar Cascade)"""
+    detections = []
     if face_cascade is not None and not face_cascade.empty():
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = (ctx or context_for(frame)).gray()
             faces = face_cascade.detectMultiScale(
                 gray,
                 scaleFactor=1.1,
@@ -191,138 +383,526 @@ def detect_objects(frame):
                 minSize=(30, 30),
                 flags=cv2.CASCADE_SCALE_IMAGE
             )
-            face_count = len(faces)
-            counts["Faces"] = face_count
+            counts["Faces"] = len(faces)
             
             for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), COLOR_MAP['face'], 2)
-                cv2.putText(frame, "Face", (x, y - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR_MAP['face'], 2)
+                detections.append(Detection('face', "Face", int(x), int(y), int(x + w), int(y + h)))
         except Exception as e:
             print(f"Face detection error: {e}")
+    return detections
+
+def apply_yolo_result(output, counts):
+    """Map one backend output (xyxy, conf, cls arrays) onto our categories and return its detections."""
+    xyxy, conf, cls = output
+    if len(cls) == 0:
+        return []
+    xyxy = xyxy.astype(np.int32)
+    cls = cls.astype(np.int64)
     
-    # YOLO detection for vehicles, animals, traffic lights, etc.
-    if YOLO_AVAILABLE and yolo_model is not None:
-        try:
-            # Run YOLO inference
-            results = yolo_model(frame, verbose=False, conf=0.25)
-            
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    # Get box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    
-                    # Get class and confidence
-                    cls = int(box.cls[0].cpu().numpy())
-                    conf = float(box.conf[0].cpu().numpy())
-                    
-                    # Get class name
-                    class_name = result.names[cls]
-                    
-                    # Map to our categories
-                    if class_name in ['car']:
-                        counts["Cars"] += 1
-                        counts["Vehicles"] += 1
-                        color = COLOR_MAP.get('car', (255, 100, 0))
-                        label = f"Car {conf:.2f}"
-                    elif class_name in ['motorcycle', 'motorbike']:
-                        counts["Motorcycles"] += 1
-                        counts["Vehicles"] += 1
-                        color = COLOR_MAP.get('motorcycle', (255, 150, 0))
-                        label = f"Motorcycle {conf:.2f}"
-                    elif class_name in ['bus']:
-                        counts["Buses"] += 1
-                        counts["Vehicles"] += 1
-                        color = COLOR_MAP.get('bus', (255, 200, 0))
-                        label = f"Bus {conf:.2f}"
-                    elif class_name in ['truck']:
-                        counts["Trucks"] += 1
-                        counts["Vehicles"] += 1
-                        color = COLOR_MAP.get('truck', (255, 50, 0))
-                        label = f"Truck {conf:.2f}"
-                    elif class_name in ['traffic light', 'traffic_light']:
-                        counts["Traffic_Lights"] += 1
-                        color = COLOR_MAP.get('traffic_light', (0, 255, 255))
-                        label = f"Traffic Light {conf:.2f}"
-                    elif class_name in ['dog']:
-                        counts["Dogs"] += 1
-                        color = COLOR_MAP.get('dog', (255, 0, 255))
-                        label = f"Dog {conf:.2f}"
-                    elif class_name in ['cat']:
-                        counts["Cats"] += 1
-                        color = COLOR_MAP.get('cat', (255, 100, 255))
-                        label = f"Cat {conf:.2f}"
-                    elif class_name in ['cow']:
-                        counts["Cows"] += 1
-                        color = COLOR_MAP.get('cow', (128, 0, 128))
-                        label = f"Cow {conf:.2f}"
-                    elif class_name in ['horse']:
-                        counts["Horses"] += 1
-                        color = COLOR_MAP.get('horse', (200, 0, 200))
-                        label = f"Horse {conf:.2f}"
-                    elif class_name in ['person']:
-                        counts["Humans"] += 1
-                        color = COLOR_MAP.get('person', (0, 255, 0))
-                        label = f"Person {conf:.2f}"
-                    elif class_name in ['sheep']:
-                        # Map sheep to buffalo for rural context if needed, or just track as buffalo
-                        counts["Buffaloes"] += 1
-                        color = COLOR_MAP.get('buffalo', (100, 50, 0))
-                        label = f"Buffalo {conf:.2f}"
-                    elif class_name in ['bicycle']:
-                        # Bullock carts are slow moving, track them if detected as cart-like
-                        # In standard COCO, bullock carts are rare, often detected as 'truck' or 'car'
-                        # We'll add custom logic here or keep it simple
-                        pass
-                    else:
-                        continue  # Skip other classes
-                    
-                    # Draw bounding box
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, label, (x1, y1 - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-        
-        except Exception as e:
-            print(f"YOLO detection error: {e}")
+    # Map class ids to our categories; unknown classes get -1 and are skipped
+    category = np.full(len(cls), -1, dtype=np.int64)
+    known = (cls >= 0) & (cls < len(CATEGORY_LOOKUP))
+    category[known] = CATEGORY_LOOKUP[cls[known]]
+    keep = category >= 0
+    xyxy, conf, category = xyxy[keep], conf[keep], category[keep]
+    
+    tallies = np.bincount(category, minlength=len(YOLO_CATEGORIES))
+    for (count_key, _, _), n in zip(YOLO_CATEGORIES, tallies):
+        counts[count_key] += int(n)
+    counts["Vehicles"] += int(tallies[VEHICLE_CATEGORIES].sum())
+    
+    detections = []
+    for (x1, y1, x2, y2), c, score in zip(xyxy.tolist(), category.tolist(), conf.tolist()):
+        _, label, color_key = YOLO_CATEGORIES[c]
+        detections.append(Detection(color_key, label, x1, y1, x2, y2, score))
+    return detections
+
+# HOG people detection is the slowest classical stage. "fast" searches a downscaled
+# frame with a coarser window stride and pyramid step, only around moving areas,
+# and keeps a camera's earlier boxes where nothing moved; "full" is the original
+# full-resolution search. "full" stays the default: "fast" misses smaller people
+# (see the recall_vs_full column of `benchmark.py hog` on your own footage)
+HOG_MODE = os.getenv('HOG_MODE', 'full')
+HOG_SCALE = float(os.getenv('HOG_SCALE', '0.5'))
+HOG_STRIDE = int(os.getenv('HOG_STRIDE', '8'))  # pixels at HOG_SCALE
+HOG_PYRAMID_SCALE = float(os.getenv('HOG_PYRAMID_SCALE', '1.1'))
+# Grey-level change that counts as motion; 0 always searches the whole frame
+HOG_MOTION_THRESHOLD = int(os.getenv('HOG_MOTION_THRESHOLD', '25'))
+HOG_REFRESH = float(os.getenv('HOG_REFRESH', '2.0'))  # seconds between whole-frame searches per camera
+HOG_WINDOW = (64, 128)  # default people detector window (w, h)
+_hog_state = {}  # source -> (previous gray, last whole-frame search time, boxes)
+
+def _hog_search(image, stride, pyramid):
+    """detectMultiScale on one image. Returns an (n, 4) array of x, y, w, h."""
+    rects, _ = hog.detectMultiScale(
+        image,
+        winStride=(stride, stride),
+        padding=(8, 8),
+        scale=pyramid,
+        hitThreshold=0.0,
+        groupThreshold=2
+    )
+    return np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+
+def _motion_regions(previous, gray, threshold):
+    """
+    Boxes (x0, y0, x1, y1) around the areas that changed between two frames, grown
+    to at least one detector window and merged where they overlap.
+    """
+    h, w = gray.shape[:2]
+    diff = cv2.absdiff(previous, gray)
+    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    mask = cv2.dilate(mask, None, iterations=2)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]
+    stats = stats[stats[:, cv2.CC_STAT_AREA] >= 16]  # ignore sensor noise
+    
+    win_w, win_h = HOG_WINDOW
+    regions = []
+    for x, y, bw, bh in stats[:, :4].tolist():
+        # Grow by half a window on each side (a person is larger than their moving
+        # part); shifted rather than clipped at the frame edges so it stays window-sized
+        rw, rh = min(w, bw + win_w), min(h, bh + win_h)
+        rx = int(min(max(0, x + bw / 2 - rw / 2), w - rw))
+        ry = int(min(max(0, y + bh / 2 - rh / 2), h - rh))
+        regions.append([rx, ry, rx + rw, ry + rh])
+    
+    merged = True
+    while merged and len(regions) > 1:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+def hog_people(frame, source=None, ctx=None, mode=None, scale=None, stride=None, pyramid=None,
+               motion_threshold=None):
+    """
+    People boxes (x1, y1, x2, y2 in frame pixels) from the HOG detector.
+    Settings default to the HOG_* variables. With a `source` in fast mode only the
+    areas that moved since that camera's previous frame are searched.
+    """
+    mode = mode or HOG_MODE
+    if mode == 'full':
+        rects = _hog_search(frame, 4, 1.05)
+        return np.column_stack([rects[:, :2], rects[:, :2] + rects[:, 2:]]).tolist()
     
-    # Fallback to HOG for human detection if YOLO not available
-    if not YOLO_AVAILABLE:
+    scale = scale or HOG_SCALE
+    # The stride must be a multiple of the descriptor's 8 px block stride
+    stride = max(8, (stride or HOG_STRIDE) // 8 * 8)
+    pyramid = pyramid or HOG_PYRAMID_SCALE
+    threshold = HOG_MOTION_THRESHOLD if motion_threshold is None else motion_threshold
+    ctx = ctx or context_for(frame)
+    h, w = frame.shape[:2]
+    whole = (0, 0, w, h)
+    small = ctx.region(whole, scale)
+    
+    state = _hog_state.get(source) if source is not None and threshold > 0 else None
+    now = time.time()
+    regions = None  # None searches the whole frame
+    kept = []
+    if state is not None:
+        previous, searched_at, boxes = state
+        gray = ctx.gray_region(whole, scale)
+        if previous.shape == gray.shape and now - searched_at < HOG_REFRESH:
+            regions = _motion_regions(previous, gray, threshold)
+            if sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions) > 0.5 * gray.size:
+                regions = None  # most of the frame moved: one search is cheaper
+    
+    if regions is None:
+        rects = _hog_search(small, stride, pyramid)
+        searched_at = now
+    else:
+        found = [np.empty((0, 4), dtype=np.int64)]
+        for x0, y0, x1, y1 in regions:
+            region_rects = _hog_search(small[y0:y1, x0:x1], stride, pyramid)
+            region_rects[:, :2] += (x0, y0)
+            found.append(region_rects)
+        rects = np.concatenate(found)
+        # People where nothing moved are still there
+        moving = np.asarray(regions, dtype=np.float64).reshape(-1, 4) / scale
+        for box in boxes:
+            overlaps = ((moving[:, 0] < box[2]) & (box[0] < moving[:, 2])
+                        & (moving[:, 1] < box[3]) & (box[1] < moving[:, 3]))
+            if not overlaps.any():
+                kept.append(box)
+    
+    # Back to full-frame coordinates
+    people = np.column_stack([rects[:, :2], rects[:, :2] + rects[:, 2:]]) / scale
+    people = np.minimum(people, (w, h, w, h)).astype(np.int64).tolist() + kept
+    
+    if source is not None and threshold > 0:
+        gray = ctx.gray_region(whole, scale)
+        previous = state[0] if state is not None and state[0].shape == gray.shape else np.empty_like(gray)
+        np.copyto(previous, gray)
+        _hog_state[source] = (previous, searched_at, people)
+    return people
+
+def detect_humans_hog(frame, counts, source=None, ctx=None):
+    """Fallback to HOG for human detection if YOLO not available"""
+    detections = []
+    try:
+        people = hog_people(frame, source, ctx)
+        counts["Humans"] = len(people)
+        for x1, y1, x2, y2 in people:
+            detections.append(Detection('person', "Human", x1, y1, x2, y2))
+    except Exception as e:
+        print(f"Human detection error: {e}")
+    return detections
+
+def _get_executor():
+    """Shared detector thread pool, or None when DETECT_THREADS <= 1 (run sequentially)."""
+    global _executor
+    if _executor is None and DETECT_THREADS > 1:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DETECT_THREADS, thread_name_prefix="detector")
+    return _executor
+
+def _submit(executor, stage, sources, fn, *args):
+    """Run fn on the pool (or inline) and record its time under `stage` for each source."""
+    def run():
+        started = time.perf_counter()
         try:
-            result = hog.detectMultiScale(
-                frame,
-                winStride=(4, 4),
-                padding=(8, 8),
-                scale=1.05,
-                hitThreshold=0.0,
-                finalThreshold=2.0
-            )
-            
-            if isinstance(result, tuple):
-                rects, weights = result
-            else:
-                rects = result
-            
-            if len(rects) > 0:
-                rects = np.array(rects).reshape(-1, 4)
-                counts["Humans"] = len(rects)
-                
-                for i, (x, y, w, h) in enumerate(rects):
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), COLOR_MAP['person'], 2)
-                    cv2.putText(frame, "Human", (x, y - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR_MAP['person'], 2)
-        except Exception as e:
-            print(f"Human detection error: {e}")
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            for source in sources:
+                metrics.observe(stage, source or 'default', elapsed)
     
-    # Detect zebra crossing
-    if detect_zebra_crossing(frame):
-        counts["Zebra_Crossings"] = 1
-        cv2.putText(frame, "Zebra Crossing Detected", (10, frame.shape[0] - 20),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, COLOR_MAP['zebra_crossing'], 2)
+    if executor is not None:
+        return executor.submit(run)
+    future = Future()
+    try:
+        future.set_result(run())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def _faces_stage(frame, source=None, ctx=None):
+    counts = new_counts()
+    return counts, detect_faces(frame, counts, ctx)
+
+def _yolo_stage(frames):
+    results = []
+    try:
+        # Run YOLO inference on the whole batch in one call
+        for output in yolo_backend.predict(frames):
+            counts = new_counts()
+            results.append((counts, apply_yolo_result(output, counts)))
+    except Exception as e:
+        print(f"YOLO detection error: {e}")
+        # Contribute nothing, like a model that is not loaded (the hazard stage then reports "unknown")
+        results = [({}, []) for _ in frames]
+    return results
+
+def _hog_stage(frame, source=None, ctx=None):
+    counts = new_counts()
+    return counts, detect_humans_hog(frame, counts, source, ctx)
+
+def _zebra_stage(frame, source=None, ctx=None):
+    found, stripes = detect_zebra_crossing(frame, source, ctx)
+    return {"Zebra_Crossings": 1 if found else 0}, stripes
+
+def _footpath_stage(frame, source=None, ctx=None):
+    footpaths = detect_footpath(frame, source, ctx)
+    return {"Footpaths": 1 if footpaths else 0}, footpaths
+
+class DetectorSpec:
+    """
+    One registered detector stage.
+    fn(frame, source, ctx) returns a (counts part, detections) pair; with `batched`,
+    fn(frames) returns one pair per frame. cost is a rough per-frame cost in ms, and
+    costlier stages are submitted first. every/interval is the default cadence: every
+    Nth analysed frame, or at most once per `interval` seconds when > 0. yolo=True
+    runs the stage only when YOLO is available and yolo=False only when it is not.
+    loaded() tells whether the stage's model is ready. `priority` stages feed the
+    crossing-safety alert and are submitted and collected before all others.
+    """
+    __slots__ = ('name', 'fn', 'cost', 'every', 'interval', 'batched', 'yolo', 'loaded', 'priority')
+
+    def __init__(self, name, fn, cost, every=1, interval=0.0, batched=False, yolo=None, loaded=None,
+                 priority=False):
+        self.name = name
+        self.fn = fn
+        self.cost = cost
+        self.every = every
+        self.interval = interval
+        self.batched = batched
+        self.yolo = yolo
+        self.loaded = loaded or (lambda: True)
+        self.priority = priority
+
+    def applies(self, yolo_available):
+        """Whether to schedule it; yolo_available is None while still unknown."""
+        if self.yolo is None or yolo_available is None:
+            return True
+        return self.yolo == yolo_available
+
+DETECTORS = {}  # name -> DetectorSpec, in the order results are merged
+
+def register_detector(name, fn, cost, every=1, interval=0.0, batched=False, yolo=None, loaded=None,
+                      priority=False):
+    """Add a detector stage; it runs in analyze_batch() like the built-in ones."""
+    DETECTORS[name] = DetectorSpec(name, fn, cost, every, interval, batched, yolo, loaded, priority)
+
+register_detector('faces', _faces_stage, cost=15)
+# YOLO detection for vehicles, animals, traffic lights, etc. (whole batch in one call)
+register_detector('yolo', _yolo_stage, cost=40, batched=True, yolo=True,
+                  loaded=lambda: YOLO_AVAILABLE and yolo_backend is not None, priority=True)
+# Fallback to HOG for human detection if YOLO not available
+register_detector('hog', _hog_stage, cost=20, yolo=False,
+                  loaded=lambda: not YOLO_AVAILABLE and hog is not None)
+register_detector('zebra_crossing', _zebra_stage, cost=3, priority=True)
+register_detector('footpath', _footpath_stage, cost=1)
+
+def _parse_detector_config(value):
+    """
+    Parse DETECTOR_CONFIG. Entries are comma separated, each `[camera:]detector=setting`,
+    where setting is off, on, N (every Nth frame) or Ts (every T seconds).
+    Returns {(camera or None, detector): (enabled, every, interval)}.
+    """
+    config = {}
+    for item in (part.strip() for part in value.split(',')):
+        if not item:
+            continue
+        key, _, setting = item.partition('=')
+        camera, _, name = key.strip().rpartition(':')
+        setting = setting.strip().lower()
+        if setting == 'off':
+            cadence = (False, None, None)
+        elif setting == 'on':
+            cadence = (True, None, None)
+        elif setting.endswith('s'):
+            cadence = (True, 1, float(setting[:-1]))
+        else:
+            cadence = (True, max(1, int(setting)), 0.0)
+        config[(camera or None, name)] = cadence
+    return config
+
+# Per-detector enable flags and cadence, for all cameras or one camera, e.g.
+# "faces=off,footpath=2s,zebra_crossing=5,north:faces=on"
+DETECTOR_CONFIG = _parse_detector_config(os.getenv('DETECTOR_CONFIG', ''))
+for _camera, _name in DETECTOR_CONFIG:
+    if _name not in DETECTORS:
+        print(f"Warning: DETECTOR_CONFIG names unknown detector '{_name}'")
+
+_cadence = {}  # (source, detector) -> [frames seen, last run time, latest part]
+
+def detector_cadence(name, source):
+    """
+    (enabled, every, interval) of a detector on one camera. The detector's defaults
+    are overridden by the setting for all cameras, then by the camera's own setting.
+    """
+    spec = DETECTORS[name]
+    enabled, every, interval = True, spec.every, spec.interval
+    for key in ((None, name), (source, name)):
+        setting = DETECTOR_CONFIG.get(key)
+        if setting is not None:
+            enabled = setting[0]
+            if setting[1] is not None:
+                every, interval = setting[1], setting[2]
+    return enabled, every, interval
+
+def due_detectors(source, yolo_available, now=None):
+    """
+    Names of the detectors to run on this camera's current frame, costliest first.
+    Without a source (offline callers) every detector runs, ignoring DETECTOR_CONFIG.
+    """
+    now = time.time() if now is None else now
+    due = []
+    for spec in DETECTORS.values():
+        if not spec.applies(yolo_available):
+            continue
+        if source is None:
+            due.append(spec.name)
+            continue
+        enabled, every, interval = detector_cadence(spec.name, source)
+        if not enabled:
+            continue
+        state = _cadence.setdefault((source, spec.name), [0, 0.0, None])
+        if interval > 0:
+            run = now - state[1] >= interval
+        else:
+            run = state[0] % every == 0
+        state[0] += 1
+        if run or state[2] is None:
+            state[1] = now
+            due.append(spec.name)
+    return sorted(due, key=lambda name: -DETECTORS[name].cost)
+
+def planned_jobs(due, priority, split=True):
+    """
+    Jobs to submit for a batch whose frames are due on the detectors in `due` (one
+    list per frame): (detector, frame indices), costliest detector first. Batched
+    detectors get all their frames as one job, the others one job per frame unless
+    `split` is false. Only detectors whose `priority` flag matches are included.
+    """
+    for spec in sorted(DETECTORS.values(), key=lambda spec: -spec.cost):
+        if spec.priority != priority:
+            continue
+        picked = [i for i, names in enumerate(due) if spec.name in names]
+        if (spec.batched or not split) and picked:
+            yield spec.name, picked
+        elif not spec.batched:
+            for i in picked:
+                yield spec.name, [i]
+
+def merge_latest(source, fresh, yolo_available):
+    """
+    Store this frame's fresh parts ({detector: part}) and merge them with the latest
+    part of every enabled detector that did not run. Returns (counts, detections).
+    Without a source nothing is stored and only the fresh parts are merged.
+    """
+    if source is None:
+        return merge_parts([fresh[name] for name in DETECTORS if name in fresh])
+    parts = []
+    for spec in DETECTORS.values():
+        if not spec.applies(yolo_available) or not detector_cadence(spec.name, source)[0]:
+            continue
+        state = _cadence.setdefault((source, spec.name), [0, 0.0, None])
+        if spec.name in fresh:
+            state[2] = fresh[spec.name]
+        if state[2] is not None:
+            parts.append(state[2])
+    return merge_parts(parts)
+
+def run_stage(stage, frames, sources=None, contexts=None):
+    """
+    Run one detector stage on a list of frames.
+    `sources` names each frame's camera for detectors that keep state per camera;
+    `contexts` are the frames' FrameContexts, shared with the other stages.
+    Returns one (counts, detections) part per frame; stages whose model is not
+    loaded contribute nothing (an empty counts dict).
+    """
+    spec = DETECTORS[stage]
+    if not spec.loaded():
+        return [({}, []) for _ in frames]
+    if spec.batched:
+        return spec.fn(frames)
+    sources = sources or [None] * len(frames)
+    contexts = contexts or [context_for(frame) for frame in frames]
+    return [spec.fn(frame, source, ctx) for frame, source, ctx in zip(frames, sources, contexts)]
+
+def merge_parts(parts):
+    """Combine the (counts, detections) parts of one frame. Returns (counts, detections)."""
+    counts = new_counts()
+    detections = []
+    for part_counts, part_detections in parts:
+        for key, value in part_counts.items():
+            counts[key] += value
+        detections.extend(part_detections)
+    return counts, detections
+
+def tick_fps():
+    """Count one processed batch and return the detection FPS."""
+    global last_time, frame_count, fps
+    # Simple FPS calculation (one batch carries one frame per stream)
+    frame_count += 1
+    current_time = time.time()
+    if current_time - last_time >= 1.0:
+        fps = frame_count
+        frame_count = 0
+        last_time = current_time
+    return fps
+
+def analyze_batch(frames, sources=None, on_priority=None):
+    """
+    Run detection on frames from several cameras at once, without drawing anything.
+    YOLO gets the whole list as one batch; the cheap per-frame detectors run per frame.
+    The detectors only read the frame, so with DETECT_THREADS > 1 they all run
+    concurrently (OpenCV and torch release the GIL) and are merged afterwards.
+    They share one FrameContext per frame, so grayscale, HSV and the other derived
+    images are computed once per frame rather than once per detector.
+    Each registered detector runs only on the frames it is due on (see
+    DETECTOR_CONFIG); the others contribute their latest result for that camera.
+    `sources` names each frame's camera and labels its stage timings in /metrics.
+    Frames without a source (the default) keep no per-camera state: every
+    detector runs on them and no cached result is reused.
+    on_priority(i, parts) is called for every frame as soon as its priority
+    detectors have finished, with their fresh {detector: part} results.
+    Returns: list of (fps, counts_dict, detections), one per input frame
+    """
+    # Scripts calling us directly load synchronously; the web app loads in the background
+    if model_status["state"] == "idle":
+        load_models()
+    
+    fps = tick_fps()
+    sources = sources or [None] * len(frames)
+    executor = _get_executor()
+    yolo_available = YOLO_AVAILABLE and yolo_backend is not None
+    due = [due_detectors(source, yolo_available) for source in sources]
+    # Keyed by position too: a batch may hold several frames of one source
+    contexts = [context_for(frame, (source, i)) for i, (frame, source) in enumerate(zip(frames, sources))]
+    
+    jobs = []  # (detector, frame indices, future)
+    def submit(priority):
+        # One job per detector: the threads share one model per detector (OpenCV's
+        # CascadeClassifier is not thread-safe) and one source may have several
+        # frames in the batch, whose per-camera state must be updated in order
+        for name, picked in planned_jobs(due, priority, split=False):
+            picked_sources = [sources[i] for i in picked]
+            jobs.append((name, picked, _submit(executor, name, picked_sources, run_stage, name,
+                                               [frames[i] for i in picked], picked_sources,
+                                               [contexts[i] for i in picked])))
     
-    # Detect footpath
-    if detect_footpath(frame):
-        counts["Footpaths"] = 1
+    fresh = [{} for _ in frames]
+    def collect(priority):
+        for name, picked, job in jobs:
+            if DETECTORS[name].priority == priority:
+                for i, part in zip(picked, job.result()):
+                    fresh[i][name] = part
     
-    return frame, fps, counts
+    # Priority detectors (YOLO and zebra crossing) first, so the crossing-safety
+    # alert does not wait for the others; on the pool the others run alongside
+    submit(True)
+    if executor is not None:
+        submit(False)
+    collect(True)
+    if on_priority is not None:
+        for i, parts in enumerate(fresh):
+            on_priority(i, dict(parts))
+    if executor is None:
+        submit(False)
+    collect(False)
+    
+    results = []
+    for source, parts in zip(sources, fresh):
+        counts, detections = merge_latest(source, parts, yolo_available)
+        results.append((fps, counts, detections))
+    return results
+
+def render_detections(frame, detections, counts):
+    """Draw detections onto the frame. Only needed when someone is watching the video."""
+    for det in detections:
+        color = COLOR_MAP[det.kind]
+        if det.kind == 'zebra_crossing':
+            cv2.line(frame, (det.x1, det.y1), (det.x2, det.y2), color, 2)
+            continue
+        cv2.rectangle(frame, (det.x1, det.y1), (det.x2, det.y2), color, 2)
+        if det.conf is not None:
+            cv2.putText(frame, f"{det.label} {det.conf:.2f}", (det.x1, det.y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        else:
+            cv2.putText(frame, det.label, (det.x1, det.y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    
+    if counts.get("Zebra_Crossings"):
+        cv2.putText(frame, "Zebra Crossing Detected", (10, frame.shape[0] - 20),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, COLOR_MAP['zebra_crossing'], 2)
+    return frame
+
+def detect_objects(frame):
+    """
+    Detect multiple object types: vehicles, animals, traffic lights, zebra crossings, footpaths, faces, and humans.
+    Returns: (frame, fps, counts_dict)
+    """
+    frame_fps, counts, detections = analyze_batch([frame])[0]
+    return render_detections(frame, detections, counts), frame_fps, counts
@@ -0,0 +1,146 @@
+"""
+Zero-copy frame hand-off between capture, detection and encoding.
+
+Each video source owns a FrameRing: one preallocated shared-memory block of
+RING_SLOTS frame slots, plus a sequence number and a capture time per slot.
+The ring starts at 640x480x3 and is recreated at the camera's resolution from
+its first frame. The capture thread decodes straight into a free slot,
+detection (in this process or in a worker process) reads the slot in place,
+and the overlay is drawn on it before the JPEG is encoded. Nothing in the loop
+allocates frame-sized buffers, unless the camera changes resolution later on:
+those frames are letterboxed into the slots.
+"""
+import atexit
+import threading
+import weakref
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+FRAME_SHAPE = (480, 640, 3)
+# Slots per source: the one being written, the newest committed one, the one
+# being detected on, plus one spare so the writer never has to wait
+RING_SLOTS = 4
+
+_rings = weakref.WeakSet()  # rings created in this process, for locate()
+
+
+class FrameRing:
+    """
+    Preallocated shared-memory ring of frame slots with sequence numbers.
+
+    One writer claim()s a free slot, fills it and commit()s it; one consumer
+    take()s the newest committed slot. A taken slot stays pinned, so it is
+    never overwritten, until the consumer takes the next one.
+    """
+
+    def __init__(self, slots=RING_SLOTS, shape=FRAME_SHAPE):
+        self.slots = slots
+        self.shape = shape
+        frame_bytes = int(np.prod(shape))
+        header = slots * 16  # int64 sequence + float64 capture time per slot
+        self._shm = shared_memory.SharedMemory(create=True, size=header + slots * frame_bytes)
+        self.name = self._shm.name
+        self.seqs = np.ndarray((slots,), np.int64, buffer=self._shm.buf)
+        self.stamps = np.ndarray((slots,), np.float64, buffer=self._shm.buf, offset=slots * 8)
+        self.frames = np.ndarray((slots,) + tuple(shape), np.uint8, buffer=self._shm.buf, offset=header)
+        self.seqs[:] = 0
+        self._header = header
+        self._frame_bytes = frame_bytes
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._newest = -1
+        self._taken = -1
+        self._next = 0
+        _rings.add(self)
+        atexit.register(self.close)
+
+    def claim(self):
+        """Index of a slot that may be overwritten (neither the newest nor the taken one)."""
+        with self._lock:
+            for _ in range(self.slots):
+                index = self._next
+                self._next = (self._next + 1) % self.slots
+                if index != self._newest and index != self._taken:
+                    return index
+        raise RuntimeError("no free frame slot")
+
+    @property
+    def empty(self):
+        """True until the first frame is committed, i.e. nobody can hold a slot yet."""
+        return self._newest < 0
+
+    def write(self, index, frame):
+        """
+        Put a frame that was not decoded in place into slot `index`. A frame of
+        another size is scaled to fit, keeping its aspect ratio, with black bars.
+        """
+        slot = self.frames[index]
+        if np.may_share_memory(frame, slot):
+            return slot
+        if frame.shape == slot.shape:
+            slot[...] = frame
+            return slot
+        h, w = self.shape[:2]
+        scale = min(w / frame.shape[1], h / frame.shape[0])
+        fw, fh = max(1, int(frame.shape[1] * scale)), max(1, int(frame.shape[0] * scale))
+        x, y = (w - fw) // 2, (h - fh) // 2
+        slot[...] = 0
+        slot[y:y + fh, x:x + fw] = cv2.resize(frame, (fw, fh), interpolation=cv2.INTER_AREA)
+        return slot
+
+    def commit(self, index, captured_at):
+        """Publish slot `index` as the newest frame. Returns its sequence number."""
+        with self._lock:
+            self._seq += 1
+            self.seqs[index] = self._seq
+            self.stamps[index] = captured_at
+            self._newest = index
+            return self._seq
+
+    def take(self):
+        """Pin the newest committed slot for the consumer. Returns (frame view, capture time)."""
+        with self._lock:
+            if self._newest < 0:
+                return None, None
+            self._taken = self._newest
+            return self.frames[self._taken], float(self.stamps[self._taken])
+
+    def handle(self, index):
+        """(shm name, byte offset, shape, dtype) to view slot `index` from another process."""
+        return self.name, self._header + index * self._frame_bytes, self.shape, '|u1'
+
+    def close(self):
+        if self._shm is None:
+            return
+        _rings.discard(self)
+        self.seqs = self.stamps = self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # frame views still alive at exit; unlinking is what frees the memory
+        self._shm.unlink()
+        self._shm = None
+
+
+def locate(frame):
+    """Shared-memory handle of a frame that is a whole slot of one of our rings, else None."""
+    for ring in list(_rings):
+        frames = ring.frames
+        if frames is None or not np.may_share_memory(frame, frames):
+            continue
+        for index in range(ring.slots):
+            slot = frames[index]
+            if frame.shape == slot.shape and frame.ctypes.data == slot.ctypes.data:
+                return ring.handle(index)
+    return None
+
+
+def attach(name, offset, shape, dtype, cache):
+    """View a frame in another process's shared memory; `cache` keeps the segments open."""
+    shm = cache.get(name)
+    if shm is None:
+        shm = cache[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset)
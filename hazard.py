@@ -0,0 +1,142 @@
+"""
+Crossing-safety alerts from the vehicle boxes and the zebra-crossing result.
+
+This is the one answer a pedestrian is waiting for: is a vehicle approaching,
+or is it safe to cross? The alert is computed as soon as YOLO and the
+zebra-crossing detector have finished, without waiting for the other
+detectors, the overlay or JPEG encoding.
+
+Vehicle boxes are matched to the previous frame's boxes. A box that grows
+quickly is coming closer. So is a box whose bottom edge moves quickly down
+the frame.
+"""
+import time
+
+VEHICLE_KINDS = ('car', 'motorcycle', 'bus', 'truck')
+
+# Alert levels, most urgent first
+LEVELS = ('danger', 'caution', 'safe', 'unknown')
+MESSAGES = {
+    'danger': "Vehicle approaching. Do not cross.",
+    'caution': "Vehicles nearby. Wait.",
+    'safe': "No vehicles detected. Safe to cross.",
+    'unknown': "Vehicle detection unavailable.",
+}
+
+
+class HazardAlert:
+    """
+    Immutable crossing-safety alert for one analysed frame.
+
+    alert_id increases with every alert, so clients can ask for anything newer.
+    captured_at, detected_at and alerted_at are wall-clock times of the frame
+    capture, the vehicle detection result and the publication of the alert.
+    """
+
+    __slots__ = ('alert_id', 'level', 'approaching', 'vehicles', 'zebra_crossing', 'ttc_s',
+                 'captured_at', 'detected_at', 'alerted_at')
+
+    def __init__(self, alert_id, level, approaching=0, vehicles=0, zebra_crossing=False, ttc_s=None,
+                 captured_at=None, detected_at=None, alerted_at=None):
+        for name, value in zip(self.__slots__, (alert_id, level, approaching, vehicles, zebra_crossing, ttc_s,
+                                                 captured_at, detected_at, alerted_at)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HazardAlert is immutable")
+
+    def to_dict(self):
+        def ms(start, end):
+            return round((end - start) * 1000, 1) if start and end else None
+
+        return {
+            "alert_id": self.alert_id,
+            "level": self.level,
+            "message": MESSAGES[self.level] + (" Zebra crossing ahead." if self.zebra_crossing else ""),
+            "approaching": self.approaching,
+            "vehicles": self.vehicles,
+            "zebra_crossing": self.zebra_crossing,
+            "ttc_s": self.ttc_s,
+            "captured_at": round(self.captured_at, 3) if self.captured_at else None,
+            "detected_at": round(self.detected_at, 3) if self.detected_at else None,
+            "alerted_at": round(self.alerted_at, 3) if self.alerted_at else None,
+            "detection_ms": ms(self.captured_at, self.detected_at),
+            "alert_ms": ms(self.captured_at, self.alerted_at),
+        }
+
+
+def _iou(a, b):
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+class HazardMonitor:
+    """
+    Per-camera vehicle motion and alert level.
+
+    A vehicle is approaching when its box area grows by more than `growth` (a
+    fraction per second), or when its bottom edge moves down by more than
+    `speed` frame heights per second. The rates are smoothed per track with
+    weight `smoothing` for the newest measurement. Boxes are matched to the
+    previous frame's boxes by IoU of at least `match_iou`.
+    """
+
+    def __init__(self, growth=0.25, speed=0.15, smoothing=0.5, match_iou=0.3):
+        self.growth = growth
+        self.speed = speed
+        self.smoothing = smoothing
+        self.match_iou = match_iou
+        self._tracks = []  # (box, growth per second, speed in heights per second)
+        self._seen_at = None
+        self.zebra_crossing = False
+
+    def update(self, vehicle_boxes, frame_height, seen_at, zebra_crossing=None):
+        """
+        Feed one frame's vehicle boxes (x1, y1, x2, y2).
+        Returns (approaching, vehicles, time to contact in seconds or None).
+        """
+        if zebra_crossing is not None:
+            self.zebra_crossing = zebra_crossing
+        dt = seen_at - self._seen_at if self._seen_at is not None else 0.0
+        previous = list(self._tracks)
+        tracks = []
+        approaching = 0
+        ttc = None
+        for box in vehicle_boxes:
+            growth = speed = 0.0
+            best = max(previous, key=lambda track: _iou(box, track[0]), default=None)
+            if best is not None and dt > 0 and _iou(box, best[0]) >= self.match_iou:
+                previous.remove(best)
+                old = best[0]
+                old_area = max(1, (old[2] - old[0]) * (old[3] - old[1]))
+                area = (box[2] - box[0]) * (box[3] - box[1])
+                growth = (area / old_area - 1.0) / dt
+                speed = (box[3] - old[3]) / float(frame_height) / dt
+                # Smoothed so one jittery box does not raise an alert
+                growth = self.smoothing * growth + (1 - self.smoothing) * best[1]
+                speed = self.smoothing * speed + (1 - self.smoothing) * best[2]
+            tracks.append((box, growth, speed))
+            if growth > self.growth or speed > self.speed:
+                approaching += 1
+                if growth > 0:
+                    # Area grows with 1/distance^2, so distance / closing speed = 2 / growth rate
+                    ttc = min(ttc, 2.0 / growth) if ttc is not None else 2.0 / growth
+        self._tracks = tracks
+        self._seen_at = seen_at
+        return approaching, len(tracks), (round(ttc, 1) if ttc is not None else None)
+
+    def alert(self, alert_id, vehicle_boxes, frame_height, captured_at, detected_at, zebra_crossing=None):
+        """HazardAlert for one frame; vehicle_boxes is None when no vehicle detector ran."""
+        if vehicle_boxes is None:
+            if zebra_crossing is not None:
+                self.zebra_crossing = zebra_crossing
+            return HazardAlert(alert_id, 'unknown', zebra_crossing=self.zebra_crossing,
+                               captured_at=captured_at, detected_at=detected_at, alerted_at=time.time())
+        approaching, vehicles, ttc = self.update(vehicle_boxes, frame_height, captured_at, zebra_crossing)
+        level = 'danger' if approaching else 'caution' if vehicles else 'safe'
+        return HazardAlert(alert_id, level, approaching, vehicles, self.zebra_crossing, ttc,
+                           captured_at, detected_at, time.time())
@@ -0,0 +1,123 @@
+"""
+Hot-path latency instrumentation, exported in the Prometheus text format by /metrics.
+
+Every stage (capture, each detector, overlay, JPEG encode, stream write) is
+timed per video source. Each (stage, source) pair keeps a cumulative
+Prometheus histogram plus a rolling window of recent samples for quantiles.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 512  # recent samples kept per stage for quantiles
+
+
+class RollingHistogram:
+    """Cumulative bucket counts plus a bounded window of recent observations."""
+
+    __slots__ = ('buckets', 'count', 'total', 'recent')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        if not self.recent:
+            return {}
+        values = np.quantile(np.fromiter(self.recent, dtype=np.float64), QUANTILES)
+        return dict(zip(QUANTILES, values.tolist()))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (stage, source) -> RollingHistogram
+        self._gauges = {}      # (name, source) -> value
+
+    def observe(self, stage, source, seconds):
+        key = (stage, str(source))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram()
+            histogram.observe(seconds)
+
+    def set_gauge(self, name, source, value):
+        self._gauges[(name, str(source))] = value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            snapshot = [(key, list(h.buckets), h.count, h.total, h.quantiles()) for key, h in histograms]
+        gauges = sorted(self._gauges.items())
+
+        lines = [
+            "# HELP crossing_stage_seconds Processing time per pipeline stage.",
+            "# TYPE crossing_stage_seconds histogram",
+        ]
+        for (stage, source), buckets, count, total, _ in snapshot:
+            labels = f'stage="{stage}",source="{source}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'crossing_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'crossing_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'crossing_stage_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'crossing_stage_seconds_count{{{labels}}} {count}')
+
+        lines.append(f"# HELP crossing_stage_recent_seconds Stage time quantiles over the last {WINDOW} samples.")
+        lines.append("# TYPE crossing_stage_recent_seconds summary")
+        for (stage, source), _, _, _, quantiles in snapshot:
+            for q, value in quantiles.items():
+                lines.append(f'crossing_stage_recent_seconds{{stage="{stage}",source="{source}",quantile="{q}"}} {value:.6f}')
+
+        last_name = None
+        for (name, source), value in gauges:
+            if name != last_name:
+                lines.append(f"# TYPE crossing_{name} gauge")
+                last_name = name
+            lines.append(f'crossing_{name}{{source="{source}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def observe(stage, source, seconds):
+    REGISTRY.observe(stage, source, seconds)
+
+
+def set_gauge(name, source, value):
+    REGISTRY.set_gauge(name, source, value)
+
+
+@contextmanager
+def timer(stage, source):
+    """Time the enclosed block as one observation of `stage` for `source`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(stage, source, time.perf_counter() - started)
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,831 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import detect
+import metrics
+from detect import analyze_batch, render_detections
+from framering import FrameRing
+from hazard import VEHICLE_KINDS, HazardAlert, HazardMonitor
+from tracking import KeyframeScheduler, MotionGate
+from workers import DETECT_WORKERS, DetectionPool
+
+# Adaptive frame skipping: full detection only every N frames (or on motion), with
+# optical-flow tracking in between. N is tuned to keep the average per-frame cost
+# near KEYFRAME_TARGET_MS; 0 runs full detection on every frame.
+KEYFRAME_TARGET_MS = float(os.getenv('KEYFRAME_TARGET_MS', '0'))
+KEYFRAME_MAX_INTERVAL = int(os.getenv('KEYFRAME_MAX_INTERVAL', '10'))
+KEYFRAME_MOTION_THRESHOLD = float(os.getenv('KEYFRAME_MOTION_THRESHOLD', '4.0'))
+
+# Motion gate: reuse the previous result while less than this fraction of pixels
+# changed, but never for longer than MOTION_GATE_MAX_STALENESS seconds. 0 disables.
+MOTION_GATE_SENSITIVITY = float(os.getenv('MOTION_GATE_SENSITIVITY', '0'))
+MOTION_GATE_MAX_STALENESS = float(os.getenv('MOTION_GATE_MAX_STALENESS', '2.0'))
+
+# Crossing-safety alert (/hazard): a vehicle is approaching when its box grows by
+# more than HAZARD_GROWTH per second or its bottom edge moves down by more than
+# HAZARD_SPEED frame heights per second
+HAZARD_GROWTH = float(os.getenv('HAZARD_GROWTH', '0.25'))
+HAZARD_SPEED = float(os.getenv('HAZARD_SPEED', '0.15'))
+
+# Mapping from detect_objects() count names to the keys served by /stats
+STAT_KEYS = {
+    "Faces": "faces",
+    "Humans": "humans",
+    "Vehicles": "vehicles",
+    "Cars": "cars",
+    "Motorcycles": "motorcycles",
+    "Buses": "buses",
+    "Trucks": "trucks",
+    "Traffic_Lights": "traffic_lights",
+    "Dogs": "dogs",
+    "Cats": "cats",
+    "Cows": "cows",
+    "Horses": "horses",
+    "Zebra_Crossings": "zebra_crossings",
+    "Footpaths": "footpaths",
+    "Buffaloes": "buffaloes",
+    "Bullock_Carts": "bullock_carts",
+}
+
+
+MULTIPART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+# /video?tier=<name>: (scale, JPEG quality). Each frame is encoded once per tier
+# that has viewers and the chunk is shared by all of them.
+STREAM_TIERS = {
+    "full": (1.0, 90),
+    "mobile": (0.5, 60),
+}
+DEFAULT_TIER = "full"
+
+# /stats keys that change on nearly every frame; /events sends them at most once
+# per heartbeat instead of on every change
+VOLATILE_STATS = ("fps", "frame_age_ms", "dropped_frames", "frame_id", "timestamp")
+
+# Order of StatsSnapshot.values: the detection counts, then the stream health fields
+STAT_FIELDS = tuple(STAT_KEYS.values()) + ("fps", "frame_age_ms", "dropped_frames")
+NUM_COUNTS = len(STAT_KEYS)
+
+
+class StatsSnapshot:
+    """
+    Immutable /stats record for one published frame.
+
+    The pipeline swaps in a new snapshot per frame, so readers always see the
+    counts of a single frame without locking. `frame_id` increases with every
+    publish, so clients can ask for anything newer than the frame they have.
+    """
+
+    __slots__ = ('frame_id', 'timestamp', 'values')
+
+    def __init__(self, frame_id, timestamp, values):
+        object.__setattr__(self, 'frame_id', frame_id)
+        object.__setattr__(self, 'timestamp', timestamp)
+        object.__setattr__(self, 'values', values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StatsSnapshot is immutable")
+
+    def same_counts(self, other):
+        return self.values[:NUM_COUNTS] == other.values[:NUM_COUNTS]
+
+    def to_dict(self):
+        stats = dict(zip(STAT_FIELDS, self.values))
+        stats["frame_id"] = self.frame_id
+        stats["timestamp"] = round(self.timestamp, 3)
+        return stats
+
+
+def stats_from_counts(counts, fps, frame_age=0.0, dropped_frames=0):
+    """StatsSnapshot values (in STAT_FIELDS order) from a detect_objects() counts dict."""
+    return tuple([counts.get(name, 0) for name in STAT_KEYS]) + (fps, round(frame_age * 1000, 1), dropped_frames)
+
+
+def placeholder_frame(text, org=(30, 240), scale=0.8, color=(0, 0, 255)):
+    """Black 640x480 frame with a status message."""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, 2)
+    return frame
+
+
+def sample_frame(anim_pos, out=None):
+    """Generated animated frame for testing without hardware, drawn into `out` if given."""
+    h, w = 480, 640
+    if out is None:
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+    else:
+        frame = out
+        frame[...] = 0
+    # moving rectangle to show motion
+    x = anim_pos % (w - 120)
+    cv2.rectangle(frame, (x + 20, 120), (x + 120, 220), (0, 200, 0), -1)
+    cv2.putText(frame, "Sample Stream", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (200, 200, 200), 2)
+    return frame
+
+
+def draw_counts(frame, fps, counts):
+    """Draw the FPS and per-object counts overlay."""
+    cv2.putText(frame, f"FPS: {fps}", (10, 25),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    y = 40
+    for obj, cnt in counts.items():
+        cv2.putText(frame, f"{obj}: {cnt}", (10, y + 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        y += 25
+
+
+class CaptureThread:
+    """
+    Latest-frame-wins capture loop around VideoPipeline.get_camera().
+
+    Frames are grabbed continuously so OpenCV's internal buffer never fills up.
+    Each one is decoded straight into a free slot of the pipeline's FrameRing.
+    Only the newest frame is handed out; a frame replaced before the detector
+    picked it up is counted as dropped, so detection always works on the
+    freshest image.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.dropped_frames = 0
+
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._consumed_seq = 0
+        self._failures = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"capture-{self.pipeline.source_id}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            if not self.pipeline.detecting:
+                # Release camera to save resources while paused
+                self.pipeline.release_camera()
+                time.sleep(0.2)
+                continue
+
+            started = time.perf_counter()
+            ring = self.pipeline.ring
+            index = ring.claim()
+            frame = self.pipeline.read_camera(ring.frames[index])
+            if frame is None:
+                # periodically try to re-open camera
+                self._failures += 1
+                if self._failures >= 10:
+                    self._failures = 0
+                    self.pipeline.release_camera()
+                time.sleep(0.05)
+                continue
+
+            self._failures = 0
+            if frame.shape != ring.shape and ring.empty:
+                # Size the slots for this camera, so its later frames decode in place
+                ring = self.pipeline.resize_ring(frame.shape)
+                index = ring.claim()
+            # Frames of another resolution are letterboxed into the slot
+            ring.write(index, frame)
+            metrics.observe('capture', self.pipeline.source_id, time.perf_counter() - started)
+            with self._cond:
+                if self._seq > self._consumed_seq:
+                    self.dropped_frames += 1
+                self._seq = ring.commit(index, time.time())
+                self._cond.notify_all()
+
+    def latest(self, timeout=1.0):
+        """
+        Wait for a frame not yet handed out. Returns (frame, capture_time) or (None, None).
+        The frame is a view of a ring slot that stays valid until the next call.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._consumed_seq, timeout=timeout)
+            if self._seq <= self._consumed_seq:
+                return None, None
+            self._consumed_seq = self._seq
+            return self.pipeline.ring.take()
+
+
+class VideoPipeline:
+    """
+    Capture and publishing side of one video source.
+
+    The BatchScheduler pulls frames from here, runs detection once and hands
+    the result back; a single JPEG is then rendered and published to every
+    subscriber, or skipped entirely when nobody is watching.
+    Viewers only wait on the condition variable, so extra browser tabs no
+    longer cost extra detection.
+    """
+
+    def __init__(self, source, source_id='0', buffer_size=2):
+        self.source = source
+        self.source_id = source_id
+        self.sample_mode = isinstance(source, str) and source.strip().lower() == 'sample'
+        self._detecting = True
+        self.camera = None
+        self._camera_lock = threading.RLock()
+        self.ring = FrameRing()
+        self.capture = None if self.sample_mode else CaptureThread(self)
+        self.keyframes = None
+        if KEYFRAME_TARGET_MS > 0:
+            self.keyframes = KeyframeScheduler(KEYFRAME_TARGET_MS / 1000.0, KEYFRAME_MAX_INTERVAL,
+                                               KEYFRAME_MOTION_THRESHOLD)
+        self.motion_gate = None
+        if MOTION_GATE_SENSITIVITY > 0:
+            self.motion_gate = MotionGate(MOTION_GATE_SENSITIVITY, MOTION_GATE_MAX_STALENESS)
+
+        self._cond = threading.Condition()
+        self._frames = {tier: deque(maxlen=buffer_size) for tier in STREAM_TIERS}  # (seq, multipart chunk)
+        self._seq = 0
+        self._stats = StatsSnapshot(0, time.time(), stats_from_counts({}, 0))
+        self._stats_version = 0  # bumped when any detection count changes
+        self.hazard = HazardMonitor(HAZARD_GROWTH, HAZARD_SPEED)
+        self._alert = HazardAlert(0, 'unknown')
+        self._yolo_ok = False  # whether the last YOLO run produced vehicle boxes to reuse
+        self._viewers = dict.fromkeys(STREAM_TIERS, 0)
+        self._scaled = {}  # tier -> reused resize buffer
+        self._listeners = []  # callables run after every publish (asgi.py wakes its viewers)
+
+        self.fps = 0
+        self._fps_frames = 0
+        self._fps_since = time.time()
+        self._anim_pos = 0
+        self._last_frame_at = 0.0
+        self._last_placeholder_at = 0.0
+
+    @property
+    def detecting(self):
+        return self._detecting
+
+    @detecting.setter
+    def detecting(self, value):
+        with self._cond:
+            self._detecting = value
+            # Push the new state to /events subscribers right away
+            self._stats_version += 1
+            self._cond.notify_all()
+        self._notify_listeners()
+
+    # ------------------------------------------------------------------ #
+    # Camera handling
+    # ------------------------------------------------------------------ #
+
+    def get_camera(self):
+        """Return a working cv2.VideoCapture or None if it cannot be opened."""
+        with self._camera_lock:
+            return self._open_camera()
+
+    def _open_camera(self):
+        if self.camera is None or not getattr(self.camera, 'isOpened', lambda: False)():
+            src = self.source
+            try:
+                if isinstance(src, str) and src.isdigit():
+                    src_val = int(src)
+                else:
+                    src_val = src
+
+                print("Opening camera source:", src_val)
+                # Try opening with different backends for better compatibility
+                if os.name == 'nt':  # Windows
+                    camera = cv2.VideoCapture(src_val, cv2.CAP_DSHOW)
+                else:
+                    camera = cv2.VideoCapture(src_val)
+
+                if not camera.isOpened():
+                    camera = cv2.VideoCapture(src_val)  # Fallback
+
+                time.sleep(0.5)
+
+                if not camera.isOpened():
+                    print("Camera failed to open")
+                    try:
+                        camera.release()
+                    except Exception:
+                        pass
+                    camera = None
+                else:
+                    print("Camera opened successfully")
+                    # Set some properties for better performance
+                    camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+                    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                self.camera = camera
+
+            except Exception as e:
+                print("Camera exception:", e)
+                self.camera = None
+
+        return self.camera
+
+    def release_camera(self):
+        """Release the capture device so other processes can use it."""
+        with self._camera_lock:
+            camera, self.camera = self.camera, None
+        if camera is not None:
+            try:
+                camera.release()
+                print("Camera released")
+            except Exception as e:
+                print(f"Error releasing camera: {e}")
+
+    # ------------------------------------------------------------------ #
+    # Frame source (driven by BatchScheduler)
+    # ------------------------------------------------------------------ #
+
+    def start(self):
+        """Start the capture thread if this source has one."""
+        if self.capture is not None:
+            self.capture.start()
+        return self
+
+    def resize_ring(self, shape):
+        """Replace the frame ring, before anything was committed to it, by one with `shape` slots."""
+        old, self.ring = self.ring, FrameRing(shape=shape)
+        old.close()
+        return self.ring
+
+    def _sample_frame(self, captured_at):
+        index = self.ring.claim()
+        sample_frame(self._anim_pos, out=self.ring.frames[index])
+        self._anim_pos += 8
+        self.ring.commit(index, captured_at)
+        return self.ring.take()
+
+    def read_camera(self, out=None):
+        """Read one frame from the camera (into `out` when it fits), or None if it is unavailable."""
+        with self._camera_lock:
+            cam = self.get_camera()
+            if cam is None:
+                return None
+            try:
+                success, frame = cam.read(out)
+            except Exception:
+                return None
+        return frame if success else None
+
+    def next_frame(self, timeout=0.0):
+        """Newest frame not yet detected on. Returns (frame, capture_time) or (None, None)."""
+        now = time.time()
+        if self.sample_mode:
+            # throttle synthetic stream to reasonable rate
+            if now - self._last_frame_at < 0.03:
+                return None, None
+            self._last_frame_at = now
+            return self._sample_frame(now)
+
+        frame, captured_at = self.capture.latest(timeout=timeout)
+        if frame is not None:
+            self._last_frame_at = captured_at
+        elif now - self._last_frame_at >= 1.0 and now - self._last_placeholder_at >= 1.0:
+            # Placeholder frame when camera is not available
+            self._last_placeholder_at = now
+            frame_out = placeholder_frame("Camera not available") if self.viewers else None
+            self.publish_hazard_unknown()
+            self._publish(stats_from_counts({}, 0, dropped_frames=self.dropped_frames), frame_out)
+        return frame, captured_at
+
+    def publish_paused(self):
+        """Send the paused placeholder, at most once per second."""
+        now = time.time()
+        if now - self._last_placeholder_at >= 1.0:
+            self._last_placeholder_at = now
+            frame = None
+            if self.viewers:
+                frame = placeholder_frame("Detection Paused", org=(180, 240), scale=1, color=(255, 255, 255))
+            self.publish_hazard_unknown()
+            self._publish(stats_from_counts({}, 0, dropped_frames=self.dropped_frames), frame)
+
+    def _tick_fps(self):
+        """Frames processed per wall-clock second on this source."""
+        self._fps_frames += 1
+        now = time.time()
+        if now - self._fps_since >= 1.0:
+            self.fps = self._fps_frames
+            self._fps_frames = 0
+            self._fps_since = now
+        return self.fps
+
+    def publish_detection(self, frame, fps, counts, detections, frame_age):
+        """
+        Publish a detection result. The overlay is drawn and the JPEG encoded only
+        while someone is watching /video; headless deployments just update stats.
+        `fps` is ignored in favour of this source's own frame rate.
+        """
+        fps = self._tick_fps()
+        values = stats_from_counts(counts, fps, frame_age, self.dropped_frames)
+        metrics.set_gauge('fps', self.source_id, fps)
+        metrics.set_gauge('frame_age_seconds', self.source_id, round(frame_age, 4))
+        metrics.set_gauge('dropped_frames_total', self.source_id, self.dropped_frames)
+        metrics.set_gauge('viewers', self.source_id, self.viewers)
+        if not self.viewers:
+            self._publish(values)
+            return
+        with metrics.timer('overlay', self.source_id):
+            render_detections(frame, detections, counts)
+            draw_counts(frame, fps, counts)
+        self._publish(values, frame)
+
+    def publish_hazard(self, parts, frame_height, captured_at):
+        """
+        Publish the crossing-safety alert from a frame's fresh priority detector parts,
+        before the rest of its detection is finished.
+        """
+        detected_at = time.time()
+        yolo = parts.get('yolo')
+        zebra = parts.get('zebra_crossing')
+        zebra_found = bool(zebra[0].get("Zebra_Crossings")) if zebra is not None else None
+        if yolo is None and self._alert.level != 'unknown':
+            return  # YOLO skipped this frame (DETECTOR_CONFIG): the last alert stands
+        # An empty counts part means YOLO is not loaded or failed
+        boxes = None
+        if yolo is not None:
+            self._yolo_ok = bool(yolo[0])
+            if yolo[0]:
+                boxes = [(d.x1, d.y1, d.x2, d.y2) for d in yolo[1] if d.kind in VEHICLE_KINDS]
+        self._publish_alert(boxes, frame_height, captured_at, detected_at, zebra_found)
+
+    def publish_reused_hazard(self, counts, detections, frame_height, captured_at):
+        """
+        Publish the alert for a frame whose detections were reused by the motion gate
+        or tracked from the last keyframe, so the alert keeps following the scene.
+        """
+        boxes = None
+        if self._yolo_ok:
+            boxes = [(d.x1, d.y1, d.x2, d.y2) for d in detections if d.kind in VEHICLE_KINDS]
+        self._publish_alert(boxes, frame_height, captured_at, time.time(), bool(counts.get("Zebra_Crossings")))
+
+    def publish_hazard_unknown(self, captured_at=None):
+        """Publish an 'unknown' alert when no detection result exists (camera lost, paused, failed)."""
+        self._publish_alert(None, None, captured_at, None, None)
+
+    def _publish_alert(self, boxes, frame_height, captured_at, detected_at, zebra_found):
+        with self._cond:
+            alert = self.hazard.alert(self._alert.alert_id + 1, boxes, frame_height,
+                                      captured_at, detected_at, zebra_found)
+            self._alert = alert
+            self._cond.notify_all()
+        if captured_at is not None:
+            metrics.observe('hazard_alert', self.source_id, alert.alerted_at - captured_at)
+        self._notify_listeners()
+
+    def _encode(self, frame, tier):
+        """Encode a frame for one tier and wrap it in a multipart chunk."""
+        scale, quality = STREAM_TIERS[tier]
+        with metrics.timer(f'encode_{tier}', self.source_id):
+            if scale != 1.0:
+                h, w = frame.shape[:2]
+                size = (max(1, int(w * scale)), max(1, int(h * scale)))
+                scaled = self._scaled.get(tier)
+                if scaled is None or scaled.shape[:2] != (size[1], size[0]):
+                    scaled = self._scaled[tier] = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                frame = cv2.resize(frame, size, dst=scaled, interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                _, buffer = cv2.imencode(".jpg", placeholder_frame("Frame encode error", org=(10, 240), scale=0.7))
+            # Built once from the encoder's buffer and shared by all viewers of the tier
+            return b"".join((MULTIPART_HEADER, buffer.data, b"\r\n"))
+
+    def _publish(self, values, frame=None):
+        chunks = {}
+        if frame is not None:
+            for tier, viewers in list(self._viewers.items()):
+                if viewers:
+                    chunks[tier] = self._encode(frame, tier)
+
+        with self._cond:
+            stats = StatsSnapshot(self._stats.frame_id + 1, time.time(), values)
+            if not stats.same_counts(self._stats):
+                self._stats_version += 1
+            self._stats = stats
+            if chunks:
+                self._seq += 1
+                for tier, chunk in chunks.items():
+                    self._frames[tier].append((self._seq, chunk))
+            self._cond.notify_all()
+        self._notify_listeners()
+
+    # ------------------------------------------------------------------ #
+    # Subscribers
+    # ------------------------------------------------------------------ #
+
+    @property
+    def dropped_frames(self):
+        """Camera frames overwritten before detection could use them."""
+        return self.capture.dropped_frames if self.capture is not None else 0
+
+    @property
+    def stats(self):
+        """Latest detection statistics as a StatsSnapshot."""
+        return self._stats
+
+    @property
+    def viewers(self):
+        """Number of open /video streams on this source, over all tiers."""
+        return sum(self._viewers.values())
+
+    @property
+    def seq(self):
+        """Sequence number of the newest published frame."""
+        return self._seq
+
+    def add_viewer(self, tier=DEFAULT_TIER):
+        with self._cond:
+            self._viewers[tier] += 1
+
+    def remove_viewer(self, tier=DEFAULT_TIER):
+        with self._cond:
+            self._viewers[tier] -= 1
+
+    def add_listener(self, callback):
+        """Run callback() (on the publishing thread, so it must be quick) after every publish."""
+        self._listeners.append(callback)
+
+    def _notify_listeners(self):
+        for callback in list(self._listeners):
+            callback()
+
+    def latest_chunk(self, tier, last_seq):
+        """Newest chunk of a tier if it is newer than last_seq. Returns (seq, chunk) or (last_seq, None)."""
+        frames = self._frames[tier]
+        with self._cond:
+            if not frames or frames[-1][0] <= last_seq:
+                return last_seq, None
+            return frames[-1]
+
+    def wait_for_frame(self, last_seq, tier=DEFAULT_TIER, timeout=5.0):
+        """Block until a frame newer than last_seq is published. Returns (seq, chunk) or (last_seq, None)."""
+        frames = self._frames[tier]
+        with self._cond:
+            self._cond.wait_for(lambda: frames and frames[-1][0] > last_seq, timeout=timeout)
+        return self.latest_chunk(tier, last_seq)
+
+    def wait_for_snapshot(self, since, timeout=0.0):
+        """Latest StatsSnapshot, waiting up to `timeout` seconds for one newer than frame `since`."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._stats.frame_id > since, timeout=timeout)
+            return self._stats
+
+    @property
+    def alert(self):
+        """Latest crossing-safety alert as a HazardAlert."""
+        return self._alert
+
+    def wait_for_alert(self, since, timeout=0.0):
+        """Latest HazardAlert, waiting up to `timeout` seconds for one newer than alert `since`."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._alert.alert_id > since, timeout=timeout)
+            return self._alert
+
+    def wait_for_stats(self, last_version, timeout=1.0):
+        """Block until detection counts change after last_version. Returns (version, stats)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._stats_version > last_version, timeout=timeout)
+            return self._stats_version, self._stats
+
+    def events(self, heartbeat=1.0):
+        """Server-sent events generator for /events (see StatsEvents)."""
+        events = StatsEvents(self, heartbeat)
+        version = -1
+        while True:
+            version, stats = self.wait_for_stats(version, timeout=events.timeout())
+            event = events.event(version, stats)
+            if event:
+                yield event
+
+    def stream(self, tier=DEFAULT_TIER):
+        """MJPEG multipart generator for /video in one of STREAM_TIERS."""
+        self.add_viewer(tier)
+        # Only frames rendered after this viewer joined are sent
+        last_seq = self._seq
+        try:
+            while True:
+                last_seq, chunk = self.wait_for_frame(last_seq, tier)
+                if chunk is None:
+                    continue
+                # Time until the server asks for the next chunk, i.e. the client write
+                started = time.perf_counter()
+                yield chunk
+                metrics.observe('yield', self.source_id, time.perf_counter() - started)
+        finally:
+            self.remove_viewer(tier)
+
+
+class StatsEvents:
+    """
+    Per-client state of an /events stream.
+
+    Each event is a JSON object holding only the /stats keys (plus "detecting")
+    that differ from what this client was last sent. Count changes go out as
+    soon as they are published; fps and frame age at most once per heartbeat.
+    """
+
+    def __init__(self, pipeline, heartbeat=1.0):
+        self.pipeline = pipeline
+        self.heartbeat = heartbeat
+        self._sent = {}
+        self._last_beat = 0.0
+        self._last_sent = 0.0
+
+    def timeout(self):
+        """Seconds until the next heartbeat is due."""
+        return max(0.0, self._last_beat + self.heartbeat - time.time())
+
+    def event(self, version, stats):
+        """SSE text for this stats snapshot, a keepalive comment, or None if nothing is due."""
+        now = time.time()
+        beat = now - self._last_beat >= self.heartbeat
+        current = dict(stats.to_dict(), detecting=self.pipeline.detecting)
+        delta = {key: value for key, value in current.items()
+                 if self._sent.get(key, None) != value and (beat or key not in VOLATILE_STATS)}
+        if beat:
+            self._last_beat = now
+        if delta:
+            self._sent.update(delta)
+            self._last_sent = now
+            return f"id: {version}\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+        if now - self._last_sent >= 15.0:
+            # Comment line so proxies do not close an idle stream
+            self._last_sent = now
+            return ": keepalive\n\n"
+        return None
+
+
+class BatchScheduler:
+    """
+    Single detection thread shared by all video sources.
+
+    Each step collects the newest frame from every camera and submits them to
+    analyze_batch() as one YOLO batch, then fans the results back out to
+    the per-source pipelines. `analyze` may be a DetectionPool's analyze_batch
+    to run detection in worker processes.
+    """
+
+    def __init__(self, pipelines, batch_wait=0.05, analyze=analyze_batch):
+        # Synthetic sources go last so their frames are not aged by waiting on cameras
+        self.pipelines = sorted(pipelines, key=lambda p: p.sample_mode)
+        self.batch_wait = batch_wait  # seconds to wait for cameras to deliver a frame
+        self.analyze = analyze
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start capture threads and the detection thread if not already running."""
+        with self._start_lock:
+            for pipeline in self.pipelines:
+                pipeline.start()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                print("Pipeline error:", e)
+                time.sleep(0.5)
+
+    def _step(self):
+        batch = []
+        deadline = time.time() + self.batch_wait
+        for pipeline in self.pipelines:
+            if not pipeline.detecting:
+                pipeline.publish_paused()
+                continue
+            frame, captured_at = pipeline.next_frame(timeout=max(0.0, deadline - time.time()))
+            if frame is not None:
+                batch.append((pipeline, frame, captured_at))
+
+        if not batch:
+            time.sleep(0.01)
+            return
+
+        # Static scenes reuse their last result; sources between keyframes only
+        # need their boxes tracked
+        keyframes = []
+        for pipeline, frame, captured_at in batch:
+            gate = pipeline.motion_gate
+            changed = True
+            if gate is not None:
+                with metrics.timer('motion_gate', pipeline.source_id):
+                    changed = gate.should_detect(frame)
+            if not changed:
+                fps, counts, detections = gate.result
+                pipeline.publish_reused_hazard(counts, detections, frame.shape[0], captured_at)
+                pipeline.publish_detection(frame, fps, dict(counts), detections, time.time() - captured_at)
+            elif pipeline.keyframes is None or pipeline.keyframes.needs_keyframe(frame):
+                keyframes.append((pipeline, frame, captured_at))
+            else:
+                started = time.time()
+                with metrics.timer('track', pipeline.source_id):
+                    fps, counts, detections = pipeline.keyframes.track(frame)
+                if gate is not None:
+                    gate.store((fps, counts, detections))
+                pipeline.publish_reused_hazard(counts, detections, frame.shape[0], captured_at)
+                pipeline.publish_detection(frame, fps, counts, detections, started - captured_at)
+
+        if not keyframes:
+            return
+
+        def publish_hazard(i, parts):
+            # Runs as soon as YOLO and the zebra-crossing detector are done
+            pipeline, frame, captured_at = keyframes[i]
+            try:
+                pipeline.publish_hazard(parts, frame.shape[0], captured_at)
+            except Exception as e:
+                print("Hazard alert error:", e)
+
+        started = time.time()
+        frames = [frame for _, frame, _ in keyframes]
+        try:
+            results = self.analyze(frames, [pipeline.source_id for pipeline, _, _ in keyframes],
+                                   on_priority=publish_hazard)
+        except Exception as e:
+            print("Detection error:", e)
+            for pipeline, _, captured_at in keyframes:
+                # No result for this frame: never let an old "safe" stand
+                pipeline.publish_hazard_unknown(captured_at)
+            for frame in frames:
+                cv2.putText(frame, "Detection error", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            results = [(0, {}, []) for _ in frames]
+        elapsed = time.time() - started
+
+        for (pipeline, frame, captured_at), (fps, counts, detections) in zip(keyframes, results):
+            if counts:
+                if pipeline.keyframes is not None:
+                    pipeline.keyframes.update(frame, fps, counts, detections, elapsed)
+                if pipeline.motion_gate is not None:
+                    pipeline.motion_gate.store((fps, counts, detections))
+            # Capture-to-detection age: bounded by one inference, not by buffer depth
+            pipeline.publish_detection(frame, fps, counts, detections, started - captured_at)
+
+
+def parse_sources(spec):
+    """
+    Split a VIDEO_SOURCE value into [(source_id, source)].
+
+    Sources are comma separated; each may be prefixed with a name, e.g.
+    "north=rtsp://cam1/stream,south=1". Unnamed sources are numbered by position.
+    """
+    sources = []
+    for index, item in enumerate(part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        name, sep, value = item.partition('=')
+        if sep and name.isidentifier():
+            sources.append((name, value.strip()))
+        else:
+            sources.append((str(index), item))
+    return sources
+
+
+class PipelineGroup:
+    """All video sources of this process plus the scheduler that batches their detection."""
+
+    def __init__(self, spec, workers=DETECT_WORKERS):
+        self.pipelines = {}
+        for source_id, source in parse_sources(spec) or [('0', spec)]:
+            self.pipelines[source_id] = VideoPipeline(source, source_id)
+        self.default = next(iter(self.pipelines.values()))
+        # With DETECT_WORKERS > 0 the models live in worker processes, not in this one
+        self.pool = DetectionPool(workers) if workers > 0 else None
+        analyze = self.pool.analyze_batch if self.pool is not None else analyze_batch
+        self.scheduler = BatchScheduler(self.pipelines.values(), analyze=analyze)
+
+    def get(self, source_id):
+        return self.pipelines.get(source_id)
+
+    def start(self):
+        self.scheduler.start()
+        return self
+
+    def start_loading(self):
+        """Load the detection models in the background (in the worker pool if there is one)."""
+        if self.pool is not None:
+            self.pool.start()
+        else:
+            detect.start_loading()
+
+    @property
+    def detecting(self):
+        return self.default.detecting
+
+    @detecting.setter
+    def detecting(self, value):
+        for pipeline in self.pipelines.values():
+            pipeline.detecting = value
+
+    def release_cameras(self):
+        for pipeline in self.pipelines.values():
+            pipeline.release_camera()
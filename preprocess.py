@@ -0,0 +1,114 @@
+"""
+Per-frame preprocessing shared by the detectors.
+
+Several detectors need images derived from the same frame, such as
+grayscale, HSV, downscaled regions and edges. A FrameContext computes each
+of them at most once per frame and gives the same array to every detector
+that asks. The outputs go into buffers that are reused from one frame to
+the next. analyze_batch keeps one context per frame position in the batch,
+so buffers are never overwritten while another frame is still being analysed,
+and resets it on every call, since the frame array itself may be a reused
+capture buffer or ring slot that now holds a newer image.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameContext:
+    """Lazily computed, cached derived images of one frame."""
+
+    def __init__(self):
+        self.frame = None
+        self._lock = threading.RLock()  # detectors of one frame may run on several threads
+        self._cache = {}    # key -> derived image of the current frame
+        self._buffers = {}  # key -> output array reused across frames
+
+    def reset(self, frame):
+        with self._lock:
+            self.frame = frame
+            self._cache.clear()
+
+    def _buffer(self, key, shape):
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[key] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _get(self, key, compute):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is None:
+                image = self._cache[key] = compute(key)
+            return image
+
+    @staticmethod
+    def _scaled_size(crop, scale):
+        h, w = crop.shape[:2]
+        return max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+
+    def gray(self):
+        """Full-resolution grayscale."""
+        return self._get(('gray',), lambda key: cv2.cvtColor(
+            self.frame, cv2.COLOR_BGR2GRAY, dst=self._buffer(key, self.frame.shape[:2])))
+
+    def region(self, box, scale=1.0):
+        """BGR crop of box = (x0, y0, x1, y1) pixels, resized by `scale`."""
+        def compute(key):
+            x0, y0, x1, y1 = box
+            crop = self.frame[y0:y1, x0:x1]
+            if scale == 1.0:
+                return crop
+            w, h = self._scaled_size(crop, scale)
+            return cv2.resize(crop, (w, h), dst=self._buffer(key, (h, w, 3)), interpolation=cv2.INTER_AREA)
+        return self._get(('bgr', box, scale), compute)
+
+    def gray_region(self, box, scale=1.0):
+        """Grayscale crop, resized from the shared full-resolution gray image."""
+        def compute(key):
+            x0, y0, x1, y1 = box
+            crop = self.gray()[y0:y1, x0:x1]
+            if scale == 1.0:
+                return crop
+            w, h = self._scaled_size(crop, scale)
+            return cv2.resize(crop, (w, h), dst=self._buffer(key, (h, w)), interpolation=cv2.INTER_AREA)
+        return self._get(('gray', box, scale), compute)
+
+    def hsv_region(self, box, scale=1.0):
+        """HSV version of region(box, scale)."""
+        def compute(key):
+            bgr = self.region(box, scale)
+            return cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, dst=self._buffer(key, bgr.shape))
+        return self._get(('hsv', box, scale), compute)
+
+    def edges(self, box, scale=1.0, low=50, high=150):
+        """Canny edges of gray_region(box, scale)."""
+        def compute(key):
+            gray = self.gray_region(box, scale)
+            return cv2.Canny(gray, low, high, edges=self._buffer(key, gray.shape))
+        return self._get(('edges', box, scale, low, high), compute)
+
+
+_contexts = {}  # key -> FrameContext
+_contexts_lock = threading.Lock()
+
+
+def context_for(frame, key=None):
+    """
+    FrameContext for `frame`. The context stored under `key` is reset on every
+    call, so nothing derived from a previous frame is returned even when the
+    caller refilled the same array, and it keeps its buffers; without a `key` a
+    throwaway context is returned. Call this once per analysed frame: a keyed
+    context must not be reused for another frame while still in use.
+    """
+    if key is None:
+        context = FrameContext()
+        context.reset(frame)
+        return context
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = _contexts[key] = FrameContext()
+    context.reset(frame)
+    return context
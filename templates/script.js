@@ -208,6 +208,11 @@ function initializeFullscreen() {
 }
 
 function startStatsPolling() {
+    if (window.EventSource) {
+        subscribeToStats();
+        return;
+    }
+
     // Poll status every 2 seconds
     setInterval(updateDetectionStatus, 2000);
 
@@ -216,33 +221,58 @@ function startStatsPolling() {
     updateStatsFromAPI(); // Initial call
 }
 
+function subscribeToStats() {
+    // The server pushes only the keys that changed, as soon as detection sees them
+    const source = new EventSource('/events');
+    let current = {};
+
+    source.onmessage = function (event) {
+        const delta = JSON.parse(event.data);
+        current = Object.assign(current, delta);
+        applyStats(current);
+        if ('detecting' in delta) {
+            detectionActive = delta.detecting;
+            updateDetectionUI(detectionActive);
+        }
+    };
+
+    source.onerror = function () {
+        // EventSource reconnects by itself; start again from a full snapshot
+        current = {};
+    };
+}
+
 async function updateStatsFromAPI() {
     try {
         const response = await fetch('/stats');
         const data = await response.json();
-        stats.faces = data.faces || 0;
-        stats.humans = data.humans || 0;
-        stats.vehicles = data.vehicles || 0;
-        stats.cars = data.cars || 0;
-        stats.motorcycles = data.motorcycles || 0;
-        stats.buses = data.buses || 0;
-        stats.trucks = data.trucks || 0;
-        stats.traffic_lights = data.traffic_lights || 0;
-        stats.dogs = data.dogs || 0;
-        stats.cats = data.cats || 0;
-        stats.cows = data.cows || 0;
-        stats.horses = data.horses || 0;
-        stats.zebra_crossings = data.zebra_crossings || 0;
-        stats.footpaths = data.footpaths || 0;
-        stats.buffaloes = data.buffaloes || 0;
-        stats.bullock_carts = data.bullock_carts || 0;
-        stats.fps = data.fps || 0;
-        updateStatsDisplay();
+        applyStats(data);
     } catch (error) {
         console.error('Error fetching stats:', error);
     }
 }
 
+function applyStats(data) {
+    stats.faces = data.faces || 0;
+    stats.humans = data.humans || 0;
+    stats.vehicles = data.vehicles || 0;
+    stats.cars = data.cars || 0;
+    stats.motorcycles = data.motorcycles || 0;
+    stats.buses = data.buses || 0;
+    stats.trucks = data.trucks || 0;
+    stats.traffic_lights = data.traffic_lights || 0;
+    stats.dogs = data.dogs || 0;
+    stats.cats = data.cats || 0;
+    stats.cows = data.cows || 0;
+    stats.horses = data.horses || 0;
+    stats.zebra_crossings = data.zebra_crossings || 0;
+    stats.footpaths = data.footpaths || 0;
+    stats.buffaloes = data.buffaloes || 0;
+    stats.bullock_carts = data.bullock_carts || 0;
+    stats.fps = data.fps || 0;
+    updateStatsDisplay();
+}
+
 function updateStatsDisplay() {
     // Update all stat displays
     const statElements = {
@@ -308,6 +338,13 @@ function initializeVideoStream() {
     const videoStream = document.getElementById('video-stream');
 
     if (videoStream) {
+        // Half-resolution stream on small screens and slow or data-saving connections
+        const connection = navigator.connection || {};
+        const slow = connection.saveData || /(^|-)(2g|3g)$/.test(connection.effectiveType || '');
+        if (window.innerWidth < 768 || slow) {
+            videoStream.src = '/video?tier=mobile';
+        }
+
         // Handle video load
         videoStream.addEventListener('load', function () {
             hideLoading();
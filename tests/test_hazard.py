@@ -0,0 +1,37 @@
+from hazard import HazardMonitor
+
+
+def alert_after(boxes_per_frame, dt=0.5, **kwargs):
+    monitor = HazardMonitor()
+    alert = None
+    for i, boxes in enumerate(boxes_per_frame):
+        alert = monitor.alert(i + 1, boxes, 480, 100.0 + i * dt, 100.0 + i * dt, **kwargs)
+    return alert
+
+
+def test_growing_box_is_danger_with_time_to_contact():
+    alert = alert_after([[(100, 100, 200, 200)], [(90, 90, 210, 210)]])
+    assert alert.level == 'danger'
+    assert alert.approaching == 1
+    assert alert.ttc_s is not None and alert.ttc_s > 0
+
+
+def test_static_box_is_caution():
+    alert = alert_after([[(100, 100, 200, 200)]] * 3)
+    assert alert.level == 'caution'
+    assert alert.approaching == 0
+    assert alert.vehicles == 1
+    assert alert.ttc_s is None
+
+
+def test_no_boxes_is_safe():
+    alert = alert_after([[], []], zebra_crossing=True)
+    assert alert.level == 'safe'
+    assert alert.vehicles == 0
+    assert alert.to_dict()["message"].endswith("Zebra crossing ahead.")
+
+
+def test_no_vehicle_detector_is_unknown():
+    alert = alert_after([[(100, 100, 200, 200)], None])
+    assert alert.level == 'unknown'
+    assert alert.alert_id == 2
@@ -0,0 +1,22 @@
+import time
+
+from pipeline import BatchScheduler, VideoPipeline
+from workers import DetectionPool
+
+
+def test_scheduler_detects_through_pool(capsys):
+    pipeline = VideoPipeline('sample', 'pool-test')
+    pool = DetectionPool(1)
+    scheduler = BatchScheduler([pipeline], batch_wait=0.0, analyze=pool.analyze_batch)
+    try:
+        deadline = time.time() + 60
+        while pipeline.alert.alert_id == 0 and time.time() < deadline:
+            scheduler._step()
+        output = capsys.readouterr().out
+        assert "Detection error" not in output
+        # The crossing-safety alert is published through on_priority
+        assert pipeline.alert.alert_id > 0
+        assert pipeline.stats.frame_id > 0
+    finally:
+        pool.close()
+        pipeline.ring.close()
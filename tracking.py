@@ -0,0 +1,180 @@
+import math
+import time
+import warnings
+
+import cv2
+import numpy as np
+
+from detect import Detection
+
+# Detections of static scenery are carried over unchanged between keyframes
+STATIC_KINDS = {'zebra_crossing', 'footpath'}
+
+# Width of the grayscale image used for motion checks and optical flow
+TRACK_WIDTH = 320
+
+
+class KeyframeScheduler:
+    """
+    Runs full detection only on keyframes and tracks boxes in between.
+
+    A keyframe is taken every `interval` frames, or earlier when the scene
+    changed more than `motion_threshold` since the last keyframe. Between
+    keyframes boxes are moved with sparse Lucas-Kanade optical flow and the
+    keyframe counts are reused, so /stats stays stable. The interval is tuned
+    so that the average per-frame cost stays close to `target_latency` seconds.
+    """
+
+    def __init__(self, target_latency=0.05, max_interval=10, motion_threshold=4.0):
+        self.target_latency = target_latency
+        self.max_interval = max_interval
+        self.motion_threshold = motion_threshold  # mean abs gray difference (0-255)
+        self.interval = 1
+
+        self._since_keyframe = 0
+        self._keyframe_gray = None
+        self._prev_gray = None
+        self._counts = None
+        self._detections = []
+        self._fps = 0
+        self._full_time = None   # EMA of full detection time
+        self._track_time = 0.0   # EMA of tracking time
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        scale = TRACK_WIDTH / float(w)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (TRACK_WIDTH, int(h * scale)), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def needs_keyframe(self, frame):
+        """Decide whether this frame must go through full detection."""
+        if self._counts is None or self._since_keyframe + 1 >= self.interval:
+            return True
+        gray = self._small_gray(frame)
+        if gray.shape != self._keyframe_gray.shape:
+            return True
+        motion = cv2.absdiff(gray, self._keyframe_gray).mean()
+        return motion > self.motion_threshold
+
+    def update(self, frame, fps, counts, detections, elapsed):
+        """Record a keyframe result and retune the interval from its cost."""
+        gray = self._small_gray(frame)
+        self._keyframe_gray = gray
+        self._prev_gray = gray
+        self._fps = fps
+        self._counts = counts
+        self._detections = detections
+        self._since_keyframe = 0
+
+        if self._full_time is None:
+            self._full_time = elapsed
+        else:
+            self._full_time = 0.8 * self._full_time + 0.2 * elapsed
+        self._tune()
+
+    def _tune(self):
+        # Average cost over an interval of N frames: (full + (N - 1) * track) / N <= target
+        full, track = self._full_time, self._track_time
+        if full <= self.target_latency:
+            self.interval = 1
+        elif self.target_latency <= track:
+            self.interval = self.max_interval
+        else:
+            needed = math.ceil((full - track) / (self.target_latency - track))
+            self.interval = max(1, min(self.max_interval, needed))
+
+    def track(self, frame):
+        """Propagate the last keyframe's boxes onto this frame. Returns (fps, counts, detections)."""
+        started = time.time()
+        gray = self._small_gray(frame)
+        scale = frame.shape[1] / float(gray.shape[1])
+
+        moving = [det for det in self._detections if det.kind not in STATIC_KINDS]
+        tracked = [det for det in self._detections if det.kind in STATIC_KINDS]
+        if moving:
+            tracked.extend(self._flow_boxes(moving, gray, scale, frame.shape))
+
+        self._detections = tracked
+        self._prev_gray = gray
+        self._since_keyframe += 1
+        self._track_time = 0.8 * self._track_time + 0.2 * (time.time() - started)
+        return self._fps, dict(self._counts), tracked
+
+    def _flow_boxes(self, detections, gray, scale, shape):
+        # 3x3 grid of points inside every box, all tracked in one LK call
+        boxes = np.array([[d.x1, d.y1, d.x2, d.y2] for d in detections], dtype=np.float32) / scale
+        grid = np.array([0.25, 0.5, 0.75], dtype=np.float32)
+        gx, gy = np.meshgrid(grid, grid)
+        gx, gy = gx.ravel(), gy.ravel()
+        xs = boxes[:, 0:1] + (boxes[:, 2:3] - boxes[:, 0:1]) * gx
+        ys = boxes[:, 1:2] + (boxes[:, 3:4] - boxes[:, 1:2]) * gy
+        points = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+
+        shift = (new_points - points).reshape(len(detections), -1, 2)
+        valid = status.reshape(len(detections), -1).astype(bool)
+        shift[~valid] = np.nan
+        with warnings.catch_warnings():
+            # boxes with no tracked points give an all-NaN row -> no shift
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median = np.nanmedian(shift, axis=1)
+        median = np.nan_to_num(median) * scale
+
+        h, w = shape[:2]
+        moved = []
+        for det, (dx, dy) in zip(detections, median.tolist()):
+            dx, dy = int(round(dx)), int(round(dy))
+            moved.append(Detection(det.kind, det.label,
+                                   min(max(det.x1 + dx, 0), w - 1), min(max(det.y1 + dy, 0), h - 1),
+                                   min(max(det.x2 + dx, 0), w - 1), min(max(det.y2 + dy, 0), h - 1),
+                                   det.conf))
+        return moved
+
+
+class MotionGate:
+    """
+    Frame-differencing gate in front of detection.
+
+    A small blurred grayscale copy of each frame is compared with the one the
+    last detection ran on. If fewer than `sensitivity` (fraction of pixels)
+    changed by more than `pixel_threshold` grey levels, the previous result is
+    reused. A result is never reused for longer than `max_staleness` seconds.
+    """
+
+    def __init__(self, sensitivity=0.002, max_staleness=2.0, pixel_threshold=25, width=160):
+        self.sensitivity = sensitivity
+        self.max_staleness = max_staleness
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.result = None
+
+        self._reference = None
+        self._reference_at = 0.0
+        self._pending = None
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, (self.width, max(1, int(h * self.width / float(w)))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_detect(self, frame):
+        """True if the scene changed enough (or the last result is too old) to run detection."""
+        self._pending = self._small_gray(frame)
+        if self.result is None or self._reference.shape != self._pending.shape:
+            return True
+        if time.time() - self._reference_at >= self.max_staleness:
+            return True
+        diff = cv2.absdiff(self._pending, self._reference)
+        changed = np.count_nonzero(diff > self.pixel_threshold)
+        return changed > self.sensitivity * diff.size
+
+    def store(self, result):
+        """Remember the result of a detection run on the frame last passed to should_detect()."""
+        self._reference = self._pending
+        self._reference_at = time.time()
+        self.result = result
@@ -0,0 +1,311 @@
+"""
+Detection worker processes.
+
+With DETECT_WORKERS > 0 the web process does not load any model. Instead it
+starts a pool of worker processes that each load the models once. Frames are
+copied once into shared-memory slots, and every detector stage of a batch
+(YOLO, faces, HOG fallback, zebra crossing, footpath) is queued as its own job.
+As a result one stream spreads its detectors across cores, several streams
+spread their frames across workers, and only slot names and small results
+cross the process boundary.
+"""
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import detect
+import framering
+import metrics
+
+DETECT_WORKERS = int(os.getenv('DETECT_WORKERS', '0'))
+JOB_TIMEOUT = float(os.getenv('DETECT_WORKER_TIMEOUT', '30'))
+HEALTH_INTERVAL = 0.5  # seconds between checks for dead worker processes
+RESTART_DELAY = 5.0    # a pool whose workers keep crashing is restarted at most this often
+
+
+class SharedFrames:
+    """
+    Growable set of shared-memory frame slots, reused across batches.
+    Frames that already live in a FrameRing slot are passed by reference.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = []   # SharedMemory per slot index
+        self._free = []    # indices not holding an in-flight frame
+
+    def put(self, frame):
+        """
+        Make a frame visible to the workers. Returns a (name, offset, shape, dtype)
+        handle and the slot index to release, or None if nothing was copied.
+        """
+        handle = framering.locate(frame)
+        if handle is not None:
+            return handle, None
+        frame = np.ascontiguousarray(frame)
+        with self._lock:
+            index = self._free.pop() if self._free else None
+            if index is None:
+                index = len(self._slots)
+                self._slots.append(None)
+            shm = self._slots[index]
+            if shm is None or shm.size < frame.nbytes:
+                # First use, or a larger frame than this slot was made for
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                shm = self._slots[index] = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, frame.dtype, buffer=shm.buf)[...] = frame
+        return (shm.name, 0, frame.shape, frame.dtype.str), index
+
+    def release(self, indices):
+        with self._lock:
+            self._free.extend(index for index in indices if index is not None)
+
+    def close(self):
+        with self._lock:
+            for shm in self._slots:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            self._slots = []
+            self._free = []
+
+
+def _worker_main(worker_id, jobs, results):
+    """Worker process: load the models once, then run detector stages on shared frames."""
+    error = None
+    try:
+        detect.load_models()
+    except Exception as e:
+        # Serve with whatever did load: stages without a model contribute nothing
+        error = f"worker-{worker_id}: model loading failed: {e}"
+    results.put(('ready', worker_id, detect.model_status["yolo_backend"], error or detect.model_status["error"]))
+
+    attached = {}  # slot name -> SharedMemory
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, stage, handles, sources = job
+        frames = [framering.attach(*handle, attached) for handle in handles]
+
+        started = time.perf_counter()
+        try:
+            output = detect.run_stage(stage, frames, sources)
+        except Exception as e:
+            output = RuntimeError(f"{stage}: {e}")
+        results.put(('done', job_id, output, time.perf_counter() - started))
+        del frames
+
+    for shm in attached.values():
+        shm.close()
+
+
+class DetectionPool:
+    """
+    Pool of detection processes with the same analyze_batch() interface as detect.py.
+
+    Model loading progress of the workers is mirrored into detect.model_status,
+    so /ready reports the pool. When a worker process dies, the pending jobs fail
+    at once instead of timing out and all workers are restarted on fresh queues:
+    a process killed while reading or writing a queue leaves its lock held.
+    """
+
+    def __init__(self, num_workers=DETECT_WORKERS):
+        self.num_workers = max(1, num_workers)
+        self.yolo_available = None  # unknown until the first worker has loaded
+        self._ctx = mp.get_context('spawn')  # never fork a process that runs threads and CUDA
+        self._jobs = None
+        self._results = None
+        self._frames = SharedFrames()
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._processes = []
+        self._ready = set()  # ids of the workers that have loaded their models
+        self._started_at = 0.0
+        self._failed = False  # a worker of the current processes has died
+        self._closed = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            # spawn re-runs the main script in every worker; never nest pools there
+            if self._processes or self._closed or mp.parent_process() is not None:
+                return self
+            self._start_workers()
+            threading.Thread(target=self._collect, name="detect-results", daemon=True).start()
+            atexit.register(self.close)
+            print(f"Started {self.num_workers} detection worker processes")
+        return self
+
+    def _start_workers(self):
+        detect.model_status["state"] = "loading"
+        detect.model_status["progress"] = 0.0
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._ready = set()
+        self._failed = False
+        self._started_at = time.time()
+        self._processes = []
+        for worker_id in range(self.num_workers):
+            process = self._ctx.Process(target=_worker_main, args=(worker_id, self._jobs, self._results),
+                                        name=f"detect-worker-{worker_id}", daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def _check_workers(self):
+        """
+        Fail all pending jobs if a worker process died, and restart the workers
+        (at most every RESTART_DELAY seconds). Returns False while no healthy pool runs.
+        """
+        with self._start_lock:
+            if self._closed:
+                return False
+            dead = [(worker_id, process.exitcode) for worker_id, process in enumerate(self._processes)
+                    if not process.is_alive()]
+            if not dead:
+                return True
+            if not self._failed:
+                self._failed = True
+                for worker_id, exitcode in dead:
+                    print(f"Detection worker {worker_id} exited with code {exitcode}")
+                detect.model_status["error"] = f"worker-{dead[0][0]} exited with code {dead[0][1]}"
+                detect.model_status["state"] = "loading"
+            restart = time.time() - self._started_at >= RESTART_DELAY
+            if restart:
+                for process in self._processes:
+                    if process.is_alive():
+                        process.terminate()
+                    process.join(timeout=2)
+                print("Restarting detection worker processes")
+                self._start_workers()
+        # Jobs are not tied to one worker, so any pending job may have died with it
+        with self._futures_lock:
+            pending, self._futures = self._futures, {}
+        for future, stage, _ in pending.values():
+            future.set_exception(RuntimeError(f"{stage}: a detection worker died"))
+        return restart
+
+    def _collect(self):
+        while True:
+            results = self._results
+            try:
+                message = results.get(timeout=HEALTH_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                return
+            if results is not self._results:
+                continue  # from workers that have been replaced since
+            if message[0] == 'ready':
+                self._worker_ready(*message[1:])
+                continue
+            _, job_id, output, elapsed = message
+            with self._futures_lock:
+                entry = self._futures.pop(job_id, None)
+            if entry is None:
+                continue  # timed out earlier
+            future, stage, sources = entry
+            for source in sources:
+                metrics.observe(stage, source or 'default', elapsed)
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    def _worker_ready(self, worker_id, yolo_backend, error):
+        with self._start_lock:
+            self._ready.add(worker_id)
+            self.yolo_available = yolo_backend is not None
+            name = f"worker-{worker_id}"
+            if name not in detect.model_status["loaded"]:
+                detect.model_status["loaded"].append(name)
+            detect.model_status["progress"] = round(len(self._ready) / self.num_workers, 2)
+            detect.model_status["yolo_backend"] = yolo_backend
+            if error:
+                detect.model_status["error"] = error
+            if len(self._ready) == self.num_workers:
+                detect.model_status["state"] = "ready"
+
+    def _submit(self, stage, handles, sources):
+        future = Future()
+        job_id = next(self._ids)
+        with self._futures_lock:
+            self._futures[job_id] = (future, stage, sources)
+        self._jobs.put((job_id, stage, handles, sources))
+        return job_id, future
+
+    def _wait(self, job, deadline):
+        job_id, future = job
+        error = "detection workers did not answer in time"
+        while True:
+            remaining = deadline - time.time()
+            try:
+                return future.result(timeout=max(0.0, min(remaining, HEALTH_INTERVAL)))
+            except FutureTimeout:
+                if remaining <= HEALTH_INTERVAL:
+                    break
+                if not self._check_workers() and not future.done():
+                    error = "no detection worker is running"
+                    break
+        # Forget the job; _collect drops its result should it still arrive
+        with self._futures_lock:
+            self._futures.pop(job_id, None)
+        raise RuntimeError(error)
+
+    def analyze_batch(self, frames, sources=None, on_priority=None):
+        """Same contract as detect.analyze_batch(), executed by the worker processes."""
+        self.start()
+        fps = detect.tick_fps()
+        sources = sources or [None] * len(frames)
+        stored = [self._frames.put(frame) for frame in frames]
+        handles = [handle for handle, _ in stored]
+        try:
+            # Until a worker has loaded we do not know which of YOLO/HOG exists
+            # (yolo_available is None): ask for both
+            yolo_available = self.yolo_available
+            due = [detect.due_detectors(source, yolo_available) for source in sources]
+            # The job queue is first in, first out: priority detectors are picked up first
+            jobs = [(name, picked, self._submit(name, [handles[i] for i in picked], [sources[i] for i in picked]))
+                    for priority in (True, False) for name, picked in detect.planned_jobs(due, priority)]
+
+            deadline = time.time() + JOB_TIMEOUT
+            fresh = [{} for _ in frames]
+            for priority in (True, False):
+                for name, picked, job in jobs:
+                    if detect.DETECTORS[name].priority == priority:
+                        for i, part in zip(picked, self._wait(job, deadline)):
+                            fresh[i][name] = part
+                if priority and on_priority is not None:
+                    for i, parts in enumerate(fresh):
+                        on_priority(i, dict(parts))
+            results = []
+            for source, parts in zip(sources, fresh):
+                counts, detections = detect.merge_latest(source, parts, yolo_available)
+                results.append((fps, counts, detections))
+            return results
+        finally:
+            self._frames.release([index for _, index in stored])
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+            processes, self._processes = self._processes, []
+        for _ in processes:
+            self._jobs.put(None)
+        for process in processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self._frames.close()